@@ -1,25 +1,62 @@
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox
 from pandastable import Table, TableModel
+import numpy as np
 import pandas as pd
 import vcf
 import re
 import os
-from tqdm import tqdm
 import subprocess
-import tempfile
-import shutil
+import time
+import multiprocessing
+import threading
 from tkinter import messagebox, simpledialog
+from genmastertable_core import (
+    FILTER_THREADS, LOAD_EXECUTOR, LOAD_WORKERS, OOC_AUTO_MB, OOC_PREVIEW_ROWS,
+    ChunkedTableStore, ColumnRegistry, EditOverlay, FilterPlan, GroupSummary, LoadCancelled, LoadJob,
+    ParsedFileCache, SummaryCache, TabixIndex, TableIndexes, TableView, append_aligned, compile_rule_set,
+    delimited_header_columns, genomic_columns, infer_schema,
+    load_column_profiles, load_rule_set, map_files, new_rule_set, parse_regions,
+    read_bed_regions, read_delimited_file, read_vcf_task, register_vcf_header, save_column_profile,
+    save_rule_set, summary_columns, typed_list_filter, typed_rule, vcf_field_types, vcf_header_columns,
+    write_vcf,
+)
+
+TABLE_SYNC_DELAY_MS = 100
+
+
+class MasterTableModel(TableModel):
+    """TableModel that lets cell edits introduce new values into categorical columns."""
+
+    def __init__(self, dataframe=None, on_new_category=None, on_edit=None, **kwargs):
+        self.on_new_category = on_new_category
+        self.on_edit = on_edit
+        super().__init__(dataframe, **kwargs)
+
+    def setValueAt(self, value, row, col, df=None):
+        frame = self.df if df is None else df
+        column = frame.columns[col]
+        series = frame[column]
+        old = series.iat[row]
+        if isinstance(series.dtype, pd.CategoricalDtype) and value != '' and value not in series.cat.categories:
+            frame[column] = series.cat.add_categories([value])
+            if self.on_new_category is not None:
+                self.on_new_category(column, value)
+        changed = super().setValueAt(value, row, col, df)
+        if changed and self.on_edit is not None:
+            self.on_edit(column, frame.index[row], old, frame[column].iat[row], frame[column])
+        return changed
 
 
 class AdvancedFilterWindow(Toplevel):
-    def __init__(self, parent, dataframe, disable_main_filters_callback=None, enable_main_filters_callback=None):
+    def __init__(self, parent, view, disable_main_filters_callback=None, enable_main_filters_callback=None):
         super().__init__(parent)
         self.title("Advanced Filters")
         self.geometry("800x600")
-        self.dataframe = dataframe
-        self.original_dataframe = dataframe.copy()
-        self.filtered_dataframe = None
+        self.view = view
+        self.filtered_view = None
+        self.active_plan = None
+        self.rule_set_extras = new_rule_set()
         self.disable_main_filters = disable_main_filters_callback
         self.enable_main_filters = enable_main_filters_callback
         self.loaded_from_vcf = False
@@ -39,8 +76,19 @@ class AdvancedFilterWindow(Toplevel):
         self.add_filter_row()
         self.add_btn = ttk.Button(self.main_frame, text="Add Another Filter", command=self.add_filter_row)
         self.add_btn.pack(pady=5, fill=X, padx=10)
+        expr_frame = ttk.LabelFrame(self.main_frame, text="Expression (ANDed with the rules above)", padding=10)
+        expr_frame.pack(fill=X, padx=10)
+        ttk.Label(expr_frame, text="e.g. (CADD > 25 OR REVEL > 0.7) AND gnomAD_AF < 0.001").pack(anchor=W)
+        self.expression_entry = ttk.Entry(expr_frame)
+        self.expression_entry.pack(fill=X, pady=5)
+        self.extras_label = ttk.Label(self.main_frame, text="")
+        self.extras_label.pack(anchor=W, padx=10)
         self.btn_frame = ttk.Frame(self.main_frame)
         self.btn_frame.pack(fill=X, pady=10, padx=10)
+        self.load_rules_btn = ttk.Button(self.btn_frame, text="Load Rule Set", command=self.load_rules_file)
+        self.load_rules_btn.pack(side=LEFT, padx=5, expand=True, fill=X)
+        self.save_rules_btn = ttk.Button(self.btn_frame, text="Save Rule Set", command=self.save_rules_file)
+        self.save_rules_btn.pack(side=LEFT, padx=5, expand=True, fill=X)
         self.apply_btn = ttk.Button(self.btn_frame, text="Apply Filters", command=self.apply_filters)
         self.apply_btn.pack(side=LEFT, padx=5, expand=True, fill=X)
         self.cancel_btn = ttk.Button(self.btn_frame, text="Close", command=self.on_close)
@@ -54,7 +102,7 @@ class AdvancedFilterWindow(Toplevel):
     def add_filter_row(self, column="", operator="", value=""):
         row_frame = ttk.Frame(self.rules_frame)
         row_frame.pack(fill=X, pady=5, padx=5)
-        columns = self.dataframe.columns.tolist()
+        columns = list(self.view.columns)
         col_combo = ttk.Combobox(row_frame, values=columns, state="readonly")
         col_combo.set(column)
         col_combo.pack(side=LEFT, padx=5, expand=True, fill=X)
@@ -88,20 +136,7 @@ class AdvancedFilterWindow(Toplevel):
         col = col_combo.get()
         if not col:
             return
-        col_data = self.dataframe[col]
-        def is_column_numeric(series):
-            if pd.api.types.is_numeric_dtype(series):
-                return True
-            sample = series.dropna().sample(min(100, len(series))) if len(series) > 0 else series
-            numeric_count = 0
-            for val in sample:
-                try:
-                    float(val)
-                    numeric_count += 1
-                except (ValueError, TypeError):
-                    pass
-            return numeric_count / len(sample) > 0.9 if len(sample) > 0 else False       
-        is_numeric = is_column_numeric(col_data)
+        is_numeric = self.master.column_registry.is_numeric(col)
         for row in self.filter_rows:
             if row['column'] == col_combo:
                 row['is_numeric'] = is_numeric
@@ -150,59 +185,97 @@ class AdvancedFilterWindow(Toplevel):
             if current_value not in current_columns:
                 row['column'].set('')
 
+    def collect_rules(self):
+        rules = []
+        for row in self.filter_rows:
+            col = row['column'].get()
+            op = row['operator'].get()
+            val = row['value'].get()
+            if not col or not op:
+                continue
+            if op not in ["is empty", "is not empty"] and val == "":
+                continue
+            try:
+                rules.append(typed_rule(col, op, val, self.master.column_registry))
+            except ValueError as e:
+                messagebox.showerror("Type Error", str(e))
+                return None
+        return rules
+
+    def current_rule_set(self):
+        rules = self.collect_rules()
+        if rules is None:
+            return None
+        rule_set = dict(self.rule_set_extras)
+        rule_set['rules'] = [{'column': col, 'operator': op, 'value': val} if op not in ("is empty", "is not empty")
+                             else {'column': col, 'operator': op} for col, op, val in rules]
+        rule_set['expression'] = self.expression_entry.get().strip() or None
+        return rule_set
+
+    def show_rule_set_extras(self):
+        extras = self.rule_set_extras
+        parts = []
+        if extras['filters']:
+            parts.append(f"{len(extras['filters'])} list filter(s)")
+        if extras['regions'] or extras['bed']:
+            parts.append("regions" + (f" from {os.path.basename(extras['bed'])}" if extras['bed'] else ""))
+        self.extras_label.config(text=f"Also applied from the rule set: {', '.join(parts)}" if parts else "")
+
+    def load_rules_file(self):
+        path = filedialog.askopenfilename(parent=self, title="Load Rule Set",
+            filetypes=[("Rule sets", "*.json *.yaml *.yml"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            rule_set = load_rule_set(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not load rule set:\n{str(e)}", parent=self)
+            return
+        for row in self.filter_rows[:]:
+            self.remove_filter_row(row['frame'])
+        for rule in rule_set['rules']:
+            self.add_filter_row(rule['column'], rule['operator'], str(rule.get('value', "")))
+        if not self.filter_rows:
+            self.add_filter_row()
+        self.expression_entry.delete(0, END)
+        self.expression_entry.insert(0, rule_set['expression'] or "")
+        self.rule_set_extras = dict(rule_set, rules=[], expression=None)
+        self.show_rule_set_extras()
+
+    def save_rules_file(self):
+        rule_set = self.current_rule_set()
+        if rule_set is None:
+            return
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json",
+            filetypes=[("JSON rule sets", "*.json"), ("YAML rule sets", "*.yaml *.yml")])
+        if not path:
+            return
+        try:
+            save_rule_set(path, rule_set)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not save rule set:\n{str(e)}", parent=self)
+
     def apply_filters(self):
         try:
             current_columns = self.master.MasterTable.columns
-            filtered_df = self.original_dataframe[current_columns].copy()
-            for row in self.filter_rows:
-                col = row['column'].get()
-                op = row['operator'].get()
-                val = row['value'].get()
-                if not col or not op:
-                    continue
-                series = filtered_df[col]
-                is_num = pd.api.types.is_numeric_dtype(series)
-                if op in ["is empty", "is not empty"]:
-                    filtered_df = filtered_df[series.isna() | (series == "")] if op == "is empty" else filtered_df[~series.isna() & (series != "")]
-                    continue
-                if val == "":
-                    continue
-                if is_num:
-                    try:
-                        val = float(val) if "." in val else int(val)
-                    except ValueError:
-                        messagebox.showerror("Type Error", f"Column '{col}' is numeric but '{val}' is not.")
-                        return
-                if op == "equals":
-                    filtered_df = filtered_df[series == val]
-                elif op == "not equals":
-                    filtered_df = filtered_df[series != val]
-                elif op == "contains":
-                    filtered_df = filtered_df[series.astype(str).str.contains(val, case=False, na=False)]
-                elif op == "does not contain":
-                    filtered_df = filtered_df[~series.astype(str).str.contains(val, case=False, na=False)]
-                elif op == "starts with":
-                    filtered_df = filtered_df[series.astype(str).str.startswith(val, na=False)]
-                elif op == "ends with":
-                    filtered_df = filtered_df[series.astype(str).str.endswith(val, na=False)]
-                elif op == ">":
-                    filtered_df = filtered_df[series > val]
-                elif op == ">=":
-                    filtered_df = filtered_df[series >= val]
-                elif op == "<":
-                    filtered_df = filtered_df[series < val]
-                elif op == "<=":
-                    filtered_df = filtered_df[series <= val]
-
-            current_df = self.master.table.model.df.copy()
-            common_indices = filtered_df.index.intersection(current_df.index)
-            for col in current_columns:
-                filtered_df.loc[common_indices, col] = current_df.loc[common_indices, col]
-        
-            self.filtered_dataframe = filtered_df
-            self.master.MasterTable = filtered_df
-            self.master.update_table()
-            messagebox.showinfo("Success", f"Done!\n{len(filtered_df)} rows match the filters.")
+            rule_set = self.current_rule_set()
+            if rule_set is None:
+                return
+            plan = compile_rule_set(rule_set, self.view.base.columns, self.master.column_registry,
+                                    self.master._table_indexes(), self.master.filter_threads())
+            if self.master.ooc_store is not None:
+                read_columns = list(dict.fromkeys(list(current_columns) + plan.columns))
+                view = TableView(self.master.ooc_store.select(lambda chunk: plan.apply(chunk, current_columns),
+                                                              read_columns))
+            else:
+                view = self.view.narrow(plan.positions(self.view.base)).with_columns(current_columns)
+                view = view.drop(self.master.deleted_rows)
+            report = plan.report()
+            self.filtered_view = view
+            self.active_plan = plan
+            self.master.show_view(view)
+            messagebox.showinfo("Success", f"Done!\n{len(view)} rows match the filters."
+                                           + (f"\n\n{report}" if report else ""))
         
         except Exception as e:
             messagebox.showerror("Error", f"Failed to apply filters:\n{str(e)}")
@@ -212,27 +285,188 @@ class AdvancedFilterWindow(Toplevel):
             for row in self.filter_rows[:]:  
                 self.remove_filter_row(row['frame'])
             self.add_filter_row()
-            self.filtered_dataframe = None
-            self.dataframe = self.original_dataframe.copy()
-            current_df = self.master.table.model.df.copy()
-            common_indices = self.original_dataframe.index.intersection(current_df.index)
-            current_dtypes = current_df.dtypes
-            
-            for col in self.original_dataframe.columns:
-                if col in current_df.columns:
-                    current_df.loc[common_indices, col] = self.original_dataframe.loc[common_indices, col]
-                    if col in current_dtypes:
-                        try:
-                            current_df[col] = current_df[col].astype(current_dtypes[col])
-                        except (ValueError, TypeError):
-                            pass
-            
-            self.master.MasterTable = current_df
-            self.master.update_table()
+            self.expression_entry.delete(0, END)
+            self.rule_set_extras = new_rule_set()
+            self.show_rule_set_extras()
+            self.filtered_view = None
+            self.active_plan = None
+            view = self.view.with_columns(self.master.MasterTable.columns)
+            self.master.show_view(view.drop(self.master.deleted_rows))
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to clear advanced filters:\n{str(e)}")
 
+class LoadProgressDialog(Toplevel):
+    def __init__(self, parent, job):
+        super().__init__(parent)
+        self.title(f"Loading {job.label} files")
+        self.geometry("480x150")
+        self.transient(parent)
+        self.job = job
+        frame = ttk.Frame(self, padding=10)
+        frame.pack(fill=BOTH, expand=True)
+        self.progress = ttk.Progressbar(frame, mode='determinate', maximum=max(len(job.tasks), 1))
+        self.progress.pack(fill=X, pady=5)
+        self.status = ttk.Label(frame, text=f"0/{len(job.tasks)} files")
+        self.status.pack(fill=X, pady=5)
+        self.cancel_btn = ttk.Button(frame, text="Cancel", command=self.cancel)
+        self.cancel_btn.pack(pady=5)
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def cancel(self):
+        self.job.cancel.set()
+        self.cancel_btn.config(state='disabled')
+        self.status.config(text="Cancelling after the files in progress...")
+
+    def refresh(self):
+        if self.job.cancel.is_set():
+            return
+        elapsed = max(time.time() - self.job.started, 1e-6)
+        self.progress['value'] = self.job.files_done
+        self.status.config(text=f"{self.job.files_done}/{len(self.job.tasks)} files  |  "
+                                f"{self.job.rows:,} rows  |  {self.job.rows / elapsed:,.0f} rows/s")
+
+
+class ColumnPickerDialog(Toplevel):
+    def __init__(self, parent, columns):
+        super().__init__(parent)
+        self.title("Choose Columns to Load")
+        self.geometry("420x520")
+        self.transient(parent)
+        self.columns = list(columns)
+        self.result = None
+        self.profiles = load_column_profiles()
+        frame = ttk.Frame(self, padding=10)
+        frame.pack(fill=BOTH, expand=True)
+
+        profile_frame = ttk.Frame(frame)
+        profile_frame.pack(fill=X, pady=5)
+        ttk.Label(profile_frame, text="Profile:").pack(side=LEFT)
+        self.profile_combo = ttk.Combobox(profile_frame, values=sorted(self.profiles), state="readonly")
+        self.profile_combo.pack(side=LEFT, fill=X, expand=True, padx=5)
+        self.profile_combo.bind("<<ComboboxSelected>>", self.apply_profile)
+        ttk.Button(profile_frame, text="Save Profile", command=self.save_profile).pack(side=LEFT)
+
+        list_frame = ttk.Frame(frame)
+        list_frame.pack(fill=BOTH, expand=True, pady=5)
+        self.listbox = Listbox(list_frame, selectmode=EXTENDED, exportselection=False)
+        scrollbar = ttk.Scrollbar(list_frame, orient=VERTICAL, command=self.listbox.yview)
+        self.listbox.config(yscrollcommand=scrollbar.set)
+        self.listbox.pack(side=LEFT, fill=BOTH, expand=True)
+        scrollbar.pack(side=RIGHT, fill=Y)
+        for col in self.columns:
+            self.listbox.insert(END, col)
+        self.listbox.select_set(0, END)
+
+        btn_frame = ttk.Frame(frame)
+        btn_frame.pack(fill=X, pady=5)
+        ttk.Button(btn_frame, text="Select All", command=lambda: self.listbox.select_set(0, END)).pack(side=LEFT, padx=2)
+        ttk.Button(btn_frame, text="Select None", command=lambda: self.listbox.select_clear(0, END)).pack(side=LEFT, padx=2)
+        ttk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side=RIGHT, padx=2)
+        ttk.Button(btn_frame, text="Load", command=self.confirm).pack(side=RIGHT, padx=2)
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+        self.grab_set()
+
+    def selected_columns(self):
+        return [self.columns[i] for i in self.listbox.curselection()]
+
+    def apply_profile(self, event=None):
+        wanted = set(self.profiles.get(self.profile_combo.get(), []))
+        self.listbox.select_clear(0, END)
+        for i, col in enumerate(self.columns):
+            if col in wanted:
+                self.listbox.select_set(i)
+
+    def save_profile(self):
+        columns = self.selected_columns()
+        if not columns:
+            messagebox.showwarning("No Columns", "Select at least one column to save.", parent=self)
+            return
+        name = simpledialog.askstring("Save Profile", "Profile name:", parent=self)
+        if not name:
+            return
+        try:
+            self.profiles = save_column_profile(name, columns)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save profile:\n{str(e)}", parent=self)
+            return
+        self.profile_combo['values'] = sorted(self.profiles)
+        self.profile_combo.set(name)
+
+    def confirm(self):
+        columns = self.selected_columns()
+        if not columns:
+            messagebox.showwarning("No Columns", "Select at least one column to load.", parent=self)
+            return
+        self.result = columns
+        self.destroy()
+
+
+class CohortSummaryWindow(Toplevel):
+    """Per-group variant and carrier counts with score aggregates over the table's current view."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Cohort Summary")
+        self.geometry("900x600")
+        columns = list(parent.view.columns)
+        keys, carrier = summary_columns(columns)
+        self.scores = [c for c in columns if parent.column_registry.is_numeric(c)]
+        frame = ttk.Frame(self, padding=10)
+        frame.pack(fill=BOTH, expand=True)
+
+        options = ttk.Frame(frame)
+        options.pack(fill=X)
+        ttk.Label(options, text="Group by:").grid(row=0, column=0, sticky='w')
+        self.key_combo = ttk.Combobox(options, values=columns, state="readonly")
+        self.key_combo.set(keys[0] if keys else "")
+        self.key_combo.grid(row=1, column=0, padx=5, sticky='ew')
+        ttk.Label(options, text="Then by:").grid(row=0, column=1, sticky='w')
+        self.key2_combo = ttk.Combobox(options, values=[""] + columns, state="readonly")
+        self.key2_combo.grid(row=1, column=1, padx=5, sticky='ew')
+        ttk.Label(options, text="Count carriers of:").grid(row=0, column=2, sticky='w')
+        self.carrier_combo = ttk.Combobox(options, values=[""] + columns, state="readonly")
+        self.carrier_combo.set(carrier or "")
+        self.carrier_combo.grid(row=1, column=2, padx=5, sticky='ew')
+        ttk.Label(options, text="Scores (min/max/mean):").grid(row=0, column=3, sticky='w')
+        self.score_list = Listbox(options, selectmode=EXTENDED, exportselection=False, height=4)
+        for col in self.scores:
+            self.score_list.insert(END, col)
+        self.score_list.grid(row=1, column=3, padx=5, sticky='ew')
+        ttk.Button(options, text="Summarise", command=self.refresh).grid(row=1, column=4, padx=5)
+        for i in range(4):
+            options.columnconfigure(i, weight=1)
+
+        self.status = ttk.Label(frame, text="")
+        self.status.pack(fill=X, pady=5)
+        table_frame = ttk.Frame(frame)
+        table_frame.pack(fill=BOTH, expand=True)
+        self.table = Table(table_frame, dataframe=pd.DataFrame(), showtoolbar=False, showstatusbar=True)
+        self.table.show()
+        if keys:
+            self.refresh()
+
+    def refresh(self, quiet=False):
+        keys = [k for k in (self.key_combo.get(), self.key2_combo.get()) if k]
+        if self.master.view is None or not keys:
+            if not quiet:
+                messagebox.showwarning("No Column", "Choose a column to group by.", parent=self)
+            return
+        carrier = self.carrier_combo.get() or None
+        scores = [self.scores[i] for i in self.score_list.curselection()]
+        try:
+            started = time.perf_counter()
+            summary, cached = self.master.summarise(keys, carrier, scores)
+            result = summary.table()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to summarise:\n{str(e)}", parent=self)
+            return
+        self.table.updateModel(TableModel(result))
+        self.table.redraw()
+        self.status.config(text=f"{len(result):,} groups over {len(summary):,} rows in "
+                                f"{time.perf_counter() - started:.2f}s" + (" (cached)" if cached else ""))
+
+
 class MasterTableApp(Tk):
     def __init__(self):
         super().__init__()
@@ -242,7 +476,30 @@ class MasterTableApp(Tk):
         self.vcf_headers = {}
         self.MasterTable = pd.DataFrame()
         self.original_MasterTable = pd.DataFrame()
+        self.view = None
+        self.deleted_rows = None
+        self.edits = EditOverlay()
+        self.filter_version = 0
+        self.summaries = SummaryCache()
         self.previous_columns = []
+        self._synced_columns = None
+        self._pending_sync = None
+        self.sync_requests = 0
+        self.syncs_run = 0
+        self.load_workers = LOAD_WORKERS
+        self.load_executor = LOAD_EXECUTOR
+        self.load_errors = []
+        self.file_cache = ParsedFileCache() if ParsedFileCache.available() else None
+        self.ooc_store = None
+        self._pending_store = None
+        self._pending_append = False
+        self._load_job = None
+        self.loaded_files = set()
+        self.active_filter_specs = None
+        self.active_regions = None
+        self.column_registry = ColumnRegistry()
+        self.table_indexes = None
+        self.memory_report = None
         self.style = ttk.Style()
         self.style.theme_use('clam')
         self.style.configure('TButton', font=('Arial', 14), padding=5)
@@ -272,8 +529,9 @@ class MasterTableApp(Tk):
             return result
         
         def new_deleteRow(*args, **kwargs):
+            before, selected = self.table.model.df.index, self._selected_labels()
             result = self._original_deleteRow(*args, **kwargs)
-            self._sync_rows_immediately()
+            self._sync_rows_immediately(before, selected)
             return result
         
         self.table.deleteColumn = new_deleteColumn
@@ -290,19 +548,6 @@ class MasterTableApp(Tk):
         self.create_file_controls()
         self.create_filter_controls()
 
-    def is_column_numeric(self, series):
-        if pd.api.types.is_numeric_dtype(series):
-            return True
-        sample = series.dropna().sample(min(100, len(series))) if len(series) > 0 else series
-        numeric_count = 0       
-        for val in sample:
-            try:
-                float(val)
-                numeric_count += 1
-            except (ValueError, TypeError):
-                pass
-        return numeric_count / len(sample) > 0.9 if len(sample) > 0 else False
-
     def disable_simple_filters(self):
         disabled_bg = '#e0e0e0'  
         disabled_fg = '#a0a0a0'  
@@ -315,6 +560,7 @@ class MasterTableApp(Tk):
                             foreground=disabled_fg)
         self.apply_btn.config(state='disabled')
         self.clear_btn.config(state='disabled')
+        self.region_btn.config(state='disabled')
         self.style.map('TCombobox',
                     fieldbackground=[('disabled', disabled_bg)],
                     foreground=[('disabled', disabled_fg)])
@@ -338,6 +584,7 @@ class MasterTableApp(Tk):
                             foreground=normal_fg)
         self.apply_btn.config(state='normal')
         self.clear_btn.config(state='normal')
+        self.region_btn.config(state='normal')
         self.style.map('TCombobox',
                     fieldbackground=[],
                     foreground=[])
@@ -348,28 +595,40 @@ class MasterTableApp(Tk):
         self.update()
     
     def handle_table_change(self, event=None):
-        self.after(100, self._sync_columns_immediately)
+        # Clicks and key presses arrive in bursts; keep one pending sync and restart its delay.
+        self.sync_requests += 1
+        if self._pending_sync is not None:
+            self.after_cancel(self._pending_sync)
+        self._pending_sync = self.after(TABLE_SYNC_DELAY_MS, self._run_pending_sync)
+
+    def _run_pending_sync(self):
+        self._pending_sync = None
+        self._sync_columns_immediately()
 
     def handle_column_deletion(self, event=None):
         try:
-            current_columns = self.table.model.df.columns.tolist()
-            self.MasterTable = self.MasterTable[current_columns]
-            self.deleted_columns = set(self.original_MasterTable.columns) - set(current_columns)
-            self._update_filter_dropdowns()
-            for child in self.winfo_children():
-                if isinstance(child, AdvancedFilterWindow):
-                    child.update_column_dropdowns(current_columns)
-                    
+            self._sync_columns_immediately()
+            self.deleted_columns = set(self.original_MasterTable.columns) - set(self.previous_columns)
         except Exception as e:
             print(f"Error handling column deletion: {e}")
 
     def _sync_columns_immediately(self, event=None):
+        # MasterTable is the model's frame itself, so only a changed column list needs any work;
+        # the list is replaced, never mutated, so views holding the old one stay valid. pandas
+        # Index objects are immutable, so the columns' identity serves as their version.
         try:
-            current_columns = self.table.model.df.columns.tolist()
-            self.MasterTable = self.MasterTable[current_columns]
-            
+            frame = self.table.model.df
+            if frame is self.MasterTable and frame.columns is self._synced_columns:
+                return
+            self.syncs_run += 1
+            self.MasterTable = frame
+            self._synced_columns = frame.columns
+            current_columns = self.MasterTable.columns.tolist()
             if current_columns != self.previous_columns:
                 self.previous_columns = current_columns
+                if self.view is not None:
+                    self.view = self.view.with_columns(current_columns)
+                self.column_registry.keep(current_columns)
                 self._update_filter_dropdowns()
                 for child in self.winfo_children():
                     if isinstance(child, AdvancedFilterWindow):
@@ -377,12 +636,37 @@ class MasterTableApp(Tk):
         except Exception as e:
             print(f"Error syncing columns: {e}")
 
-    def _sync_rows_immediately(self, event=None):
+    def _selected_labels(self):
+        rows = list(getattr(self.table, 'multiplerowlist', None) or [getattr(self.table, 'currentrow', None)])
+        index = self.table.model.df.index
+        return index[[r for r in rows if r is not None and 0 <= r < len(index)]]
+
+    def _sync_rows_immediately(self, before=None, selected=None):
+        """Flag the rows that left the model since ``before`` (its old index) in the deleted-row bitmap.
+
+        When exactly the ``selected`` labels went missing they are taken as the deleted rows, so a
+        deletion costs O(deleted rows); otherwise the two indexes are compared.
+        """
         try:
-            model_data = self.table.model.df
-            self.MasterTable = model_data.copy()
-            deleted_indices = set(self.original_MasterTable.index) - set(self.MasterTable.index)
-            self.deleted_indices = deleted_indices         
+            self.MasterTable = self.table.model.df
+            if before is None or len(before) == len(self.MasterTable):
+                return
+            if selected is not None and len(before) - len(self.MasterTable) == len(selected):
+                deleted = selected
+            else:
+                deleted = before[~before.isin(self.MasterTable.index)]
+            base = self.original_MasterTable
+            positions = base.index.get_indexer(deleted)
+            positions = positions[positions >= 0]
+            if len(positions):
+                if self.deleted_rows is None:
+                    self.deleted_rows = np.zeros(len(base), dtype=bool)
+                self.deleted_rows[positions] = True
+            if self.view is not None and self.view.base is base:
+                self.summaries.delete_rows(positions)
+            else:
+                self.filter_version += 1
+            self._refresh_summary_windows()
         except Exception as e:
             print(f"Error syncing rows: {e}")
 
@@ -414,6 +698,21 @@ class MasterTableApp(Tk):
 
         self.load_btn = ttk.Button(file_frame, text="Load or Merge CSV/TSV/VCF", command=self.load_merge_files)
         self.load_btn.pack(fill=BOTH, expand=True, padx=5, pady=5, ipady=10)
+        self.regions_btn = ttk.Button(file_frame, text="Load Regions from Indexed VCF.GZ", command=self.load_regions)
+        self.regions_btn.pack(fill=BOTH, expand=True, padx=5, pady=5)
+        self.out_of_core_var = BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Out-of-core mode (keep the merged table on disk)",
+                        variable=self.out_of_core_var).pack(anchor=W, padx=5)
+        self.choose_columns_var = BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Choose columns before loading",
+                        variable=self.choose_columns_var).pack(anchor=W, padx=5)
+        self.append_var = BooleanVar(value=False)
+        self.append_check = ttk.Checkbutton(file_frame, text="Append new files to the loaded table",
+                                            variable=self.append_var)
+        self.append_check.pack(anchor=W, padx=5)
+        self.parallel_filters_var = BooleanVar(value=FILTER_THREADS > 1)
+        ttk.Checkbutton(file_frame, text=f"Evaluate filters on {FILTER_THREADS} threads",
+                        variable=self.parallel_filters_var).pack(anchor=W, padx=5)
 
     def create_filter_controls(self):
         filter_frame = ttk.LabelFrame(self.control_frame, text="Filters", padding=(10,5))
@@ -442,7 +741,7 @@ class MasterTableApp(Tk):
             self.filter_sections.append({'combobox': combo, 'entry': entry})
         btn_frame = ttk.Frame(center_frame)
         btn_frame.grid(row=1, column=0, columnspan=3, pady=10, sticky='ew')
-        for i in range(5):
+        for i in range(7):
             btn_frame.columnconfigure(i, weight=1)
         self.advanced_btn = ttk.Button(btn_frame, text="Advanced Filters", command=self.open_advanced_filters)
         self.advanced_btn.grid(row=0, column=0, padx=5, pady=4, sticky='ew')
@@ -450,8 +749,10 @@ class MasterTableApp(Tk):
         self.apply_btn.grid(row=0, column=1, padx=5, pady=4, sticky='ew')
         self.clear_btn = ttk.Button(btn_frame, text="Clear Filters", command=self.clear_filters)
         self.clear_btn.grid(row=0, column=2, padx=5, pady=4, sticky='ew')
+        self.region_btn = ttk.Button(btn_frame, text="Filter by Region", command=self.filter_regions)
+        self.region_btn.grid(row=0, column=3, padx=5, pady=4, sticky='ew')
         self.clear_table_btn = ttk.Button(btn_frame, text="Clear Table", command=self.clear_table)
-        self.clear_table_btn.grid(row=0, column=3, padx=5, pady=4, sticky='ew')
+        self.clear_table_btn.grid(row=0, column=4, padx=5, pady=4, sticky='ew')
 
         self.export_menu = Menu(self, tearoff=0)
         self.export_menu.add_command(label="Export as CSV", command=self.export_csv)
@@ -472,15 +773,16 @@ class MasterTableApp(Tk):
             self.export_menu.post(event.x_root, event.y_root)
 
         self.export_btn = ttk.Button(btn_frame, text="Export as CSV/TSV/VCF")
-        self.export_btn.grid(row=0, column=4, padx=5, pady=4, sticky='ew')
+        self.export_btn.grid(row=0, column=5, padx=5, pady=4, sticky='ew')
         self.export_btn.bind("<Button-1>", show_export_menu)
+        self.summary_btn = ttk.Button(btn_frame, text="Cohort Summary", command=self.open_cohort_summary)
+        self.summary_btn.grid(row=0, column=6, padx=5, pady=4, sticky='ew')
 
 
     def update_entry_validation(self, entry, combo):
         col = combo.get()
         if col:
-            is_numeric = self.is_column_numeric(self.MasterTable[col])
-            if is_numeric:
+            if self.column_registry.is_numeric(col):
                 vcmd = (self.register(self.validate_numeric_input), '%P')
                 entry.config(validate='key', validatecommand=vcmd)
             else:
@@ -509,74 +811,62 @@ class MasterTableApp(Tk):
                 sec['combobox'].set('')
 
 
+    def collect_filter_specs(self):
+        specs = []
+        for sec in self.filter_sections:
+            col = sec['combobox'].get()
+            vals = sec['entry'].get().strip()
+            if not col or not vals:
+                continue
+            items = [v.strip() for v in re.split(r'[,\s]+', vals) if v.strip()]
+            try:
+                specs.append(typed_list_filter(col, items, self.column_registry))
+            except ValueError as e:
+                messagebox.showerror("Type Error", f"{e}\nPlease enter numbers only for this column.")
+                return None
+        return specs
+
     def apply_filters(self):
         if not self.has_data_loaded():
             self.show_no_data_message("apply filters")
             return
         try:
             current_columns = self.MasterTable.columns
-            df = self.original_MasterTable[current_columns].copy()
-            
-            for sec in self.filter_sections:
-                col = sec['combobox'].get()
-                vals = sec['entry'].get().strip()
-                if not col or not vals:
-                    continue
-                col_data = df[col]
-                def is_numeric_column(series):
-                    if pd.api.types.is_numeric_dtype(series):
-                        return True
-                    sample = series.dropna().sample(min(100, len(series))) if len(series) > 0 else series
-                    numeric_count = 0
-                    for val in sample:
-                        try:
-                            float(val)
-                            numeric_count += 1
-                        except (ValueError, TypeError):
-                            pass
-                    return numeric_count / len(sample) > 0.9 if len(sample) > 0 else False                   
-                is_numeric = is_numeric_column(col_data)
-                items = [v.strip() for v in re.split(r'[,\s]+', vals) if v.strip()]
-                    
-                if is_numeric:
-                    try:
-                        numeric_items = []
-                        for x in items:
-                            try:
-                                num_val = float(x)
-                                if '.' not in x and pd.api.types.is_integer_dtype(col_data):
-                                    num_val = int(num_val)
-                                numeric_items.append(num_val)
-                            except ValueError:
-                                messagebox.showerror(
-                                    "Type Error", 
-                                    f"Column '{col}' contains numeric data but filter value '{x}' is not numeric.\n"
-                                    f"Please enter numbers only for this column."
-                                )
-                                return
-                        items = numeric_items
-                        if not pd.api.types.is_numeric_dtype(df[col]):
-                            df[col] = pd.to_numeric(df[col], errors='coerce')
-                    except ValueError as e:
-                        messagebox.showerror("Error", f"Invalid numeric input: {str(e)}")
-                        return
-                try:
-                    if is_numeric:
-                        mask = False
-                        for val in items:
-                            mask = mask | (df[col] == val)
-                        df = df[mask]
-                    else:
-                        df = df[df[col].astype(str).str.lower().isin([str(x).lower() for x in items])]
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to apply filters:\n{str(e)}")
-                    return     
-            self.MasterTable = df
-            self.update_table()
-            messagebox.showinfo("Success", f"Done!\n{len(df)} rows match the filters.")            
+            specs = self.collect_filter_specs()
+            if specs is None:
+                return
+
+            plan = FilterPlan.compile(specs=specs, indexes=self._table_indexes(), regions=self.active_regions,
+                                      registry=self.column_registry, threads=self.filter_threads())
+            if self.ooc_store is not None:
+                read_columns = list(dict.fromkeys(list(current_columns) + plan.columns))
+                view = TableView(self.ooc_store.select(lambda chunk: plan.apply(chunk, current_columns), read_columns))
+            else:
+                base = self.original_MasterTable
+                view = TableView(base, plan.positions(base), current_columns).drop(self.deleted_rows)
+            report = plan.report()
+            self.active_filter_specs = specs
+            self.show_view(view)
+            messagebox.showinfo("Success", f"Done!\n{len(view)} rows match the filters."
+                                           + (f"\n\n{report}" if report else ""))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to apply filters:\n{str(e)}")
 
+    def filter_regions(self):
+        if not self.has_data_loaded():
+            self.show_no_data_message("filter by region")
+            return
+        columns = genomic_columns(self.original_MasterTable.columns)
+        if columns is None:
+            messagebox.showerror("Missing Columns", "Region filtering needs a chromosome column (Chrom/Chr) "
+                                                    "and a position column (Pos/Start).")
+            return
+        regions = self.ask_regions()
+        if not regions:
+            return
+        self.active_regions = [(tuple(c for c in columns if c), regions)]
+        self.apply_filters()
+
     def clear_filters(self):
         if not hasattr(self, 'original_MasterTable') or self.original_MasterTable.empty:
             self.show_no_data_message("clear filters")
@@ -585,22 +875,13 @@ class MasterTableApp(Tk):
             for sec in self.filter_sections:
                 sec['combobox'].set('')
                 sec['entry'].delete(0, END)
+            self.active_filter_specs = None
+            self.active_regions = None
 
             for child in self.winfo_children():
                 if isinstance(child, AdvancedFilterWindow):
                     child.clear_filters()
-            current_columns = set(self.MasterTable.columns)
-            restored_df = self.original_MasterTable.copy()
-            restored_df = restored_df[list(current_columns.intersection(restored_df.columns))]
-            if hasattr(self, 'deleted_indices'):
-                restored_df = restored_df.drop(index=self.deleted_indices, errors='ignore')
-            current_df = self.table.model.df.copy()
-            common_indices = restored_df.index.intersection(current_df.index)
-            for col in restored_df.columns:
-                if col in current_df.columns:
-                    restored_df.loc[common_indices, col] = current_df.loc[common_indices, col]
-            self.MasterTable = restored_df
-            self.update_table()
+            self.show_view(TableView(self.original_MasterTable, None, self.MasterTable.columns).drop(self.deleted_rows))
             messagebox.showinfo("Success", "Done")   
         except Exception as e:
             messagebox.showerror("Error", f"Failed to clear filters:\n{str(e)}")
@@ -674,7 +955,7 @@ class MasterTableApp(Tk):
         col = col_combo.get()
         if not col:
             return
-        is_numeric = pd.api.types.is_numeric_dtype(self.dataframe[col])
+        is_numeric = self.column_registry.is_numeric(col)
         for row in self.filter_rows:
             if row['column'] == col_combo:
                 row['is_numeric'] = is_numeric
@@ -708,56 +989,270 @@ class MasterTableApp(Tk):
                 filetypes=[("CSV files","*.csv"),("TSV files","*.tsv"),("VCF files","*.vcf"),("VCF GZ files","*.vcf.gz")])
             if not filepaths:
                 return
-                
+            self.load_errors = []
             ext = os.path.splitext(filepaths[0])[1].lower()
             if all(os.path.splitext(fp)[1].lower() == ext for fp in filepaths):
+                if ext not in [".csv", ".tsv", ".vcf", ".gz"]:
+                    messagebox.showerror("Error","Unsupported file type.")
+                    return
+                filepaths = self._prepare_append(filepaths, ext in [".vcf", ".gz"])
+                if not filepaths:
+                    return
+                columns = self.choose_load_columns(filepaths, ext)
+                if columns is False:
+                    return
+                if not self._pending_append and self._use_out_of_core(filepaths):
+                    self._pending_store = ChunkedTableStore()
                 if ext == ".csv": 
-                    self._load_csv(filepaths)
-                    if not self.MasterTable.empty:  
-                        messagebox.showinfo("Success", "CSV files loaded successfully!")
+                    self._load_csv(filepaths, columns)
                 elif ext == ".tsv": 
-                    self._load_tsv(filepaths)
-                    if not self.MasterTable.empty:
-                        messagebox.showinfo("Success", "TSV files loaded successfully!")
-                elif ext in [".vcf", ".gz"]: 
-                    self._load_vcf(filepaths)
-                    if not self.MasterTable.empty:
-                        messagebox.showinfo("Success", "VCF files loaded successfully!")
+                    self._load_tsv(filepaths, columns)
                 else: 
-                    messagebox.showerror("Error","Unsupported file type.")
+                    self._load_vcf(filepaths, columns=columns)
             else:
                 messagebox.showerror("Error","Cannot mix different file types.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load files:\n{str(e)}")
+        finally:
+            self._pending_append = False
+            if self._pending_store is not None:
+                self._pending_store.close()
+                self._pending_store = None
 
-    def _load_csv(self, fps):
-        self.loaded_from_vcf = False
-        data = []
-        for f in fps:
+    def load_regions(self):
+        try:
+            filepaths = filedialog.askopenfilenames(parent=self, title="Select bgzipped, indexed VCF Files",
+                filetypes=[("VCF GZ files","*.vcf.gz")])
+            if not filepaths:
+                return
+            missing = [os.path.basename(fp) for fp in filepaths if TabixIndex.find(fp) is None]
+            if missing:
+                messagebox.showerror("Missing Index", "No .tbi or .csi index found next to:\n" + "\n".join(missing))
+                return
+            regions = self.ask_regions()
+            if not regions:
+                return
+            self.load_errors = []
+            filepaths = self._prepare_append(filepaths, True)
+            if not filepaths:
+                return
+            columns = self.choose_load_columns(filepaths, ".gz")
+            if columns is False:
+                return
+            if not self._pending_append and self._use_out_of_core(filepaths):
+                self._pending_store = ChunkedTableStore()
+            self._load_vcf(filepaths, regions, columns)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load regions:\n{str(e)}")
+        finally:
+            self._pending_append = False
+            if self._pending_store is not None:
+                self._pending_store.close()
+                self._pending_store = None
+
+    def _prepare_append(self, filepaths, is_vcf):
+        """Decide whether this load appends; returns the files still to parse."""
+        self._pending_append = False
+        if not self.append_var.get() or not self.has_data_loaded():
+            return filepaths
+        if self.ooc_store is not None:
+            messagebox.showerror("Append", "Appending is not available in out-of-core mode. Reload all files instead.")
+            return []
+        if is_vcf != self.loaded_from_vcf:
+            messagebox.showerror("Append", "New files must be the same type as the loaded table.")
+            return []
+        new_paths = [fp for fp in filepaths if os.path.basename(fp) not in self.loaded_files]
+        if not new_paths:
+            messagebox.showinfo("Append", "All selected files are already loaded.")
+            return []
+        self._pending_append = True
+        return new_paths
+
+    def choose_load_columns(self, filepaths, ext):
+        """Return the columns to load, None for all of them, or False if the user cancelled."""
+        if not self.choose_columns_var.get():
+            return None
+        available = []
+        for fp in filepaths:
             try:
-                df = pd.concat(pd.read_csv(f, chunksize=10**12, low_memory=False), ignore_index=True)
-                df["File_Name"] = os.path.basename(f)
-                data.append(df)
+                if ext == ".csv":
+                    names = delimited_header_columns(fp, ',')
+                elif ext == ".tsv":
+                    names = delimited_header_columns(fp, '\t')
+                else:
+                    names = vcf_header_columns(fp)
             except Exception as e:
-                print(e)
-        self._finalize_load(data, "CSV")
+                self.load_errors.append((os.path.basename(fp), str(e)))
+                continue
+            available.extend(c for c in names if c not in available and c != "File_Name")
+        if not available:
+            return None
+        dialog = ColumnPickerDialog(self, available)
+        self.wait_window(dialog)
+        if dialog.result is None:
+            return False
+        if len(dialog.result) == len(available):
+            return None
+        return dialog.result
+
+    def ask_regions(self):
+        text = simpledialog.askstring(
+            "Target Regions",
+            "Enter regions as chr:start-end and/or gene symbols (comma/space).\n"
+            "Gene symbols are looked up in a BED file; leave empty to use a whole BED file.",
+            parent=self
+        )
+        if text is None:
+            return None
+        tokens = [t for t in re.split(r'[,\s]+', text) if t]
+        names = [t for t in tokens if ':' not in t]
+        try:
+            regions = parse_regions(' '.join(t for t in tokens if ':' in t))
+        except ValueError as e:
+            messagebox.showerror("Invalid Region", str(e))
+            return None
+        if names or not tokens:
+            bed = filedialog.askopenfilename(parent=self, title="Select BED File",
+                filetypes=[("BED files","*.bed *.bed.gz"),("All files","*.*")])
+            if not bed:
+                return None
+            bed_regions = read_bed_regions(bed, names or None)
+            if names and not bed_regions:
+                messagebox.showerror("No Regions", "None of the gene symbols were found in the BED file.")
+                return None
+            regions.extend(bed_regions)
+        if not regions:
+            messagebox.showerror("No Regions", "Enter at least one region.")
+            return None
+        return regions
+
+    def _start_load(self, job):
+        job.store, self._pending_store = self._pending_store, None
+        job.append, self._pending_append = self._pending_append, False
+        if self._load_job is not None:
+            if job.store is not None:
+                job.store.close()
+            messagebox.showwarning("Loading", "Wait for the current load to finish or cancel it first.")
+            return
+        job.vcf_headers = dict(self.vcf_headers)
+        self._load_job = job
+        self._set_load_controls('disabled')
+        self._load_dialog = LoadProgressDialog(self, job)
+        threading.Thread(target=self._run_load_job, args=(job,), daemon=True).start()
+        self.after(100, self._poll_load, job)
+
+    def _set_load_controls(self, state):
+        # one load at a time, and nothing that swaps out the table while it runs
+        for widget in (self.load_btn, self.regions_btn, self.clear_table_btn, self.append_check):
+            widget.config(state=state)
+
+    def _run_load_job(self, job):
+        # Runs on the worker thread: no Tk calls in here.
+        def sink(df):
+            if job.on_frame is not None:
+                job.on_frame(df)
+            job.rows += len(df)
+            if job.store is not None:
+                job.store.append(infer_schema(df, vcf_field_types(job.vcf_headers.values()))[0])
+                return None
+            return df
+
+        def progress(files_done):
+            job.files_done = files_done
+
+        try:
+            results, job.errors = map_files(job.func, job.tasks, *job.args, workers=self.load_workers,
+                                            executor=self.load_executor, sink=sink,
+                                            cancel=job.cancel, progress=progress)
+            job.data = [df for df in results if df is not None]
+            job.status = 'done'
+        except LoadCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'error'
+            job.message = str(e)
+        finally:
+            job.finished.set()
+
+    def _poll_load(self, job):
+        if not job.finished.is_set():
+            self._load_dialog.refresh()
+            self.after(100, self._poll_load, job)
+            return
+        self._load_dialog.destroy()
+        self._load_job = None
+        self._set_load_controls('normal')
+        if job.status != 'done':
+            job.data = []
+            if job.store is not None:
+                job.store.close()
+            if job.status == 'cancelled':
+                messagebox.showinfo("Cancelled", "Loading was cancelled.")
+            else:
+                messagebox.showerror("Error", f"Failed to load files:\n{job.message}")
+            return
+        self.load_errors.extend(job.errors)
+        self.vcf_headers = job.vcf_headers
+        self._pending_store = job.store
+        if not job.append:
+            self.loaded_files = set()
+        self.loaded_files.update(os.path.basename(task if isinstance(task, str) else task[0])
+                                 for task in job.tasks)
+        if job.append and job.data:
+            added = self._append_load(job.data, job.label)
+            messagebox.showinfo("Success", f"{added:,} rows appended from {job.label} files.")
+        elif job.data or (job.store is not None and job.store.n_rows):
+            self._finalize_load(job.data, job.label)
+            summary = self._memory_summary()
+            messagebox.showinfo("Success", f"{job.label} files loaded successfully!" + (f"\n{summary}" if summary else ""))
+        else:
+            if job.store is not None:
+                job.store.close()
+                self._pending_store = None
+            if job.clear_if_empty and not job.append:
+                self.MasterTable = pd.DataFrame()
+                self.original_MasterTable = pd.DataFrame()
+                self.view = None
+                self.deleted_rows = None
+                self.update_table()
+        self._report_load_errors()
+
+    def _use_out_of_core(self, filepaths):
+        if self.out_of_core_var.get():
+            return True
+        if OOC_AUTO_MB <= 0:
+            return False
+        return sum(os.path.getsize(fp) for fp in filepaths) > OOC_AUTO_MB * 1024 * 1024
+
+    def _close_store(self):
+        if self.ooc_store is not None:
+            self.ooc_store.close()
+            self.ooc_store = None
 
-    def _load_tsv(self, fps):
+    def _load_csv(self, fps, columns=None):
         self.loaded_from_vcf = False
-        data = []
-        for f in fps:
-            try:
-                df = pd.concat(pd.read_csv(f, sep='\t', chunksize=10**12, low_memory=False), ignore_index=True)
-                df["File_Name"] = os.path.basename(f)
-                data.append(df)
-            except Exception as e:
-                print(e)
-        self._finalize_load(data, "TSV")
-    
-    def _load_vcf(self, fps):
+        self._start_load(LoadJob("CSV", read_delimited_file, fps, (',', self.file_cache, columns)))
+
+    def _load_tsv(self, fps, columns=None):
+        self.loaded_from_vcf = False
+        self._start_load(LoadJob("TSV", read_delimited_file, fps, ('\t', self.file_cache, columns)))
+
+    def _report_load_errors(self):
+        if not self.load_errors:
+            return
+        lines = [f"{name}: {msg}" for name, msg in self.load_errors[:20]]
+        if len(self.load_errors) > 20:
+            lines.append(f"... and {len(self.load_errors) - 20} more")
+        messagebox.showwarning(
+            "Load Warnings",
+            f"{len(self.load_errors)} file(s) could not be loaded:\n" + "\n".join(lines),
+            parent=self
+        )
+
+    def _load_vcf(self, fps, regions=None, columns=None):
         self.loaded_from_vcf = True 
-        data = []
-        files_loaded = 0       
+        tasks = []
+        readers = {}
         for f in fps:
             try:
                 reader = vcf.Reader(filename=f)
@@ -765,171 +1260,188 @@ class MasterTableApp(Tk):
                     proceed = messagebox.askyesno(
                         "Multi-sample VCF Detected",
                         f"'{os.path.basename(f)}' contains {len(reader.samples)} samples.\n"
-                        "Would you like to split it into individual sample files?",
+                        "Would you like to split it into individual sample rows?",
                         parent=self
                     )
                     if not proceed:  
                         continue  
-                    split_files = self._split_multi_sample_vcf_python(f)
-                    for split_file in split_files:
-                        try:
-                            reader = vcf.Reader(filename=split_file)
-                            self.vcf_headers[os.path.basename(split_file)] = reader
-                            vdfs = list(self.parse_vcf(reader, os.path.basename(split_file)))
-                            if vdfs:
-                                df = pd.concat(vdfs, ignore_index=True)
-                                df["File_Name"] = os.path.basename(split_file)
-                                data.append(df)
-                                files_loaded += 1
-                        finally:
-                            if os.path.exists(split_file):
-                                os.remove(split_file)
+                    tasks.append((f, True, self.file_cache, regions, columns))
                     continue  
-                self.vcf_headers[os.path.basename(f)] = reader
-                vdfs = list(self.parse_vcf(reader, os.path.basename(f)))
-                if vdfs:
-                    df = pd.concat(vdfs, ignore_index=True)
-                    df["File_Name"] = os.path.basename(f)
-                    data.append(df)
-                    files_loaded += 1
-                    
+                readers[os.path.basename(f)] = reader
+                tasks.append((f, False, self.file_cache, regions, columns))
             except Exception as e:
-                print(f"Error processing {f}: {e}")
-        if files_loaded > 0:
-            self._finalize_load(data, "VCF")
-        else:
-            self.MasterTable = pd.DataFrame()
-            self.original_MasterTable = pd.DataFrame()
-            self.update_table()
+                self.load_errors.append((os.path.basename(f), str(e)))
 
-
-    def _split_multi_sample_vcf_python(self, vcf_path):
-        temp_dir = tempfile.mkdtemp()
-        base_name = os.path.splitext(os.path.basename(vcf_path))[0]
-        split_files = []
-        
-        try:
-            reader = vcf.Reader(filename=vcf_path)
-            original_header = {
-                'fileformat': reader.metadata.get('fileformat', 'VCFv4.2'),
-                'infos': {k: v for k, v in reader.infos.items()},
-                'formats': {k: v for k, v in reader.formats.items()},
-                'filters': {k: v for k, v in reader.filters.items()},
-                'contigs': {k: v for k, v in reader.contigs.items()},
-                'samples': reader.samples
-            }
-            
-            for sample in reader.samples:
-                output_file = os.path.join(temp_dir, f"{base_name}_{sample}.vcf")
-                split_files.append(output_file)
-                
-                with open(output_file, 'w') as f_out:
-                    sample_reader = vcf.Reader(filename=vcf_path)
-                    writer = vcf.Writer(f_out, sample_reader)
-                    
-                    for record in sample_reader:
-                        new_samples = [s for s in record.samples if s.sample == sample]
-                        if not new_samples:
-                            continue
-                        new_record = vcf.model._Record(
-                            CHROM=record.CHROM,
-                            POS=record.POS,
-                            ID=record.ID,
-                            REF=record.REF,
-                            ALT=record.ALT,
-                            QUAL=record.QUAL,
-                            FILTER=record.FILTER,
-                            INFO=record.INFO,
-                            FORMAT=record.FORMAT,
-                            sample_indexes=[0],  
-                            samples=new_samples
-                        )
-                        writer.write_record(new_record)
-                    
-                    writer.close()
-                self.vcf_headers[os.path.basename(output_file)] = {
-                    'reader': vcf.Reader(filename=output_file),
-                    'original_header': original_header
-                }
-            
-            messagebox.showinfo(
-                "Split Complete",
-                f"Split {len(split_files)} samples from {os.path.basename(vcf_path)}",
-                parent=self
-            )
-            return split_files
-            
-        except Exception as e:
-            messagebox.showerror("Split Error", str(e), parent=self)
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            return []
+        job = LoadJob("VCF", read_vcf_task, tasks, clear_if_empty=True)
+        # headers collect on the job and only reach self.vcf_headers once the load has succeeded
+        job.on_frame = lambda df: register_vcf_header(df, job.vcf_headers, readers)
+        self._start_load(job)
 
     def handle_row_deletion(self, event=None):
         try:
             selected = self.table.getSelectedRows()
             
             if selected:
-                self.table.model.df.drop(self.table.model.df.index[selected], inplace=True)
+                before = self.table.model.df.index
+                labels = before[selected]
+                self.table.model.df.drop(labels, inplace=True)
                 self.table.redraw()
-                self._sync_rows_immediately()
+                self._sync_rows_immediately(before, labels)
                 
         except Exception as e:
             print(f"Error handling row deletion: {e}")
 
-    def parse_vcf(self, reader, filename, batch_size=10**12):
-        try:
-            batch = []
-            for rec in tqdm(reader, desc=filename):
-                row = {
-                    'Chrom': rec.CHROM,
-                    'Pos': rec.POS,
-                    'ID': rec.ID or '.',
-                    'Ref': rec.REF,
-                    'Alt': ','.join(map(str, rec.ALT)),
-                    'Qual': rec.QUAL,
-                    'Filter': ';'.join(rec.FILTER) if rec.FILTER else 'PASS',
-                }
-                
-                for k, v in rec.INFO.items():
-                    row[k] = ','.join(map(str, v)) if isinstance(v, (list, tuple)) else str(v)
-                if rec.samples:
-                    format_fields = rec.FORMAT.split(':')
-                    for field in format_fields:
-                        values = []
-                        for sample in rec.samples:
-                            if hasattr(sample.data, field):
-                                val = getattr(sample.data, field)
-                                if isinstance(val, (list, tuple)):
-                                    values.append(','.join(map(str, val)))
-                                else:
-                                    values.append(str(val))
-                            else:
-                                values.append('.')
-                        row[field] = '|'.join(values)
-                
-                batch.append(row)
-                
-                if len(batch) >= batch_size:
-                    yield pd.DataFrame(batch)
-                    batch = []
-            if batch:
-                yield pd.DataFrame(batch)
-        except Exception as e:
-            print(f"Error parsing VCF: {e}")
-            yield pd.DataFrame()
-
     def _finalize_load(self, data, label):
+        store, self._pending_store = self._pending_store, None
+        self.active_filter_specs = None
+        self.active_regions = None
+        self.deleted_rows = None
+        self.edits = EditOverlay()
+        if store is not None and store.n_rows:
+            self._close_store()
+            self.ooc_store = store
+            self.column_registry = store.registry
+            self.memory_report = None
+            self.original_MasterTable = store.head(OOC_PREVIEW_ROWS)
+            self.previous_columns = self.original_MasterTable.columns.tolist()
+            self.populate_column_comboboxes()
+            self.show_view(TableView(self.original_MasterTable))
+            self.title(f"GenMasterTable - Merged {label} (out-of-core: showing {len(self.MasterTable):,} "
+                       f"of {store.n_rows:,} rows, filters scan all rows)")
+            return
+        if store is not None:
+            store.close()
         if data:
-            self.MasterTable = pd.concat(data, ignore_index=True)
-            self.original_MasterTable = self.MasterTable.copy()
-            self.previous_columns = self.MasterTable.columns.tolist()
+            self._close_store()
+            merged = pd.concat(data, ignore_index=True)
+            data.clear()
+            field_types = vcf_field_types(self.vcf_headers.values()) if label == "VCF" else None
+            self.original_MasterTable, self.memory_report = infer_schema(merged, field_types)
+            del merged
+            self.column_registry = ColumnRegistry(self.original_MasterTable)
+            self.previous_columns = self.original_MasterTable.columns.tolist()
             self.populate_column_comboboxes()
-            self.update_table()
+            self.show_view(TableView(self.original_MasterTable))
             self.title(f"GenMasterTable - Merged {label}")
 
+    def _append_load(self, data, label):
+        """Merge newly parsed files into the loaded table without touching the rows already there."""
+        merged = pd.concat(data, ignore_index=True)
+        data.clear()
+        field_types = vcf_field_types(self.vcf_headers.values()) if label == "VCF" else None
+        new_rows = infer_schema(merged, field_types)[0]
+        del merged
+        start = self.original_MasterTable.index.max() + 1 if len(self.original_MasterTable) else 0
+        offset = len(self.original_MasterTable)
+        new_rows.index = pd.RangeIndex(start, start + len(new_rows))
+        self.original_MasterTable = append_aligned(self.original_MasterTable, new_rows)
+        appended = np.arange(offset, offset + len(new_rows))
+        if self.deleted_rows is not None:
+            self.deleted_rows = np.concatenate([self.deleted_rows, np.zeros(len(new_rows), dtype=bool)])
+
+        hidden = getattr(self, 'deleted_columns', set())
+        visible = self.MasterTable.columns.tolist()
+        visible += [c for c in new_rows.columns if c not in visible and c not in hidden]
+        advanced = None
+        for child in self.winfo_children():
+            if isinstance(child, AdvancedFilterWindow):
+                child.view = TableView(self.original_MasterTable,
+                                       np.concatenate([child.view.positions(), appended]), visible)
+                child.update_column_dropdowns(visible)
+                advanced = child.active_plan
+        plan = FilterPlan.compile(specs=self.active_filter_specs, regions=self.active_regions)
+        shown = advanced.apply(new_rows) if advanced is not None else new_rows
+        shown = plan.apply(shown, [c for c in visible if c in new_rows.columns])
+        rows = np.concatenate([self.view.positions(), offset + new_rows.index.get_indexer(shown.index)])
+        self.view = TableView(self.original_MasterTable, rows, visible).drop(self.deleted_rows)
+        self.filter_version += 1
+        self.MasterTable = append_aligned(self.table.model.df, shown)[visible]
+        self.column_registry = ColumnRegistry(self.original_MasterTable)
+        self.column_registry.keep(visible)
+        self.previous_columns = visible
+        self.memory_report = None
+        self.populate_column_comboboxes()
+        self.update_table()
+        self.title(f"GenMasterTable - Merged {label} ({len(self.original_MasterTable):,} rows)")
+        self._refresh_summary_windows()
+        return len(new_rows)
+
+    def _memory_summary(self):
+        if self.memory_report is None:
+            return ""
+        before = self.memory_report['bytes_before'].sum() / 2**20
+        after = self.memory_report['bytes_after'].sum() / 2**20
+        return f"Memory: {before:,.1f} MB -> {after:,.1f} MB"
+
+    def _add_category(self, col, value):
+        if col in self.original_MasterTable.columns:
+            series = self.original_MasterTable[col]
+            if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+                self.original_MasterTable[col] = series.cat.add_categories([value])
+
+    def filter_threads(self):
+        return FILTER_THREADS if self.parallel_filters_var.get() else 1
+
+    def _table_indexes(self):
+        self.table_indexes = TableIndexes.for_frame(self.table_indexes, self.original_MasterTable)
+        return self.table_indexes
+
+    def _note_edit(self, col, label, old, new, series):
+        self.filter_version += 1
+        if self.view is None or self.view.base is not self.original_MasterTable:
+            self.column_registry.note_edit(col, old, new)
+            return
+        self.column_registry.note_edit(col, old, new, self._edited_column)
+        position = self.original_MasterTable.index.get_indexer([label])[0]
+        if position >= 0:
+            self.edits.set(position, col, new)
+
+    def _edited_column(self, col):
+        view = TableView(self.original_MasterTable, None, [col])
+        return self.edits.apply(view, view.frame())[col]
+
+    def show_view(self, view):
+        """Display a view of the loaded table with the cell edits laid over it."""
+        self.view = view
+        self.filter_version += 1
+        frame = view.frame()
+        if view.base is self.original_MasterTable:
+            frame = self.edits.apply(view, frame)
+        self.MasterTable = frame
+        self.update_table()
+        self._refresh_summary_windows()
+
+    def summarise(self, keys, carrier=None, scores=()):
+        """The GroupSummary of the current view and whether it came from the cache."""
+        key = SummaryCache.key(keys, carrier, scores, self.filter_version)
+        summary = self.summaries.get(key)
+        if summary is not None:
+            return summary, True
+        view, edits = self.view, None
+        if view.base is self.original_MasterTable:
+            view, edits = view.drop(self.deleted_rows), self.edits
+        summary = GroupSummary.from_view(view, keys, carrier, scores, edits)
+        self.summaries.put(key, summary)
+        return summary, False
+
+    def _refresh_summary_windows(self):
+        for child in self.winfo_children():
+            if isinstance(child, CohortSummaryWindow):
+                child.refresh(quiet=True)
+
+    def open_cohort_summary(self):
+        if not self.has_data_loaded() or self.view is None:
+            self.show_no_data_message("summarise the cohort")
+            return
+        for child in self.winfo_children():
+            if isinstance(child, CohortSummaryWindow):
+                child.lift()
+                return
+        CohortSummaryWindow(self).lift()
+
     def update_table(self):
-        self.table.updateModel(TableModel(self.MasterTable))
+        self.table.updateModel(MasterTableModel(self.MasterTable, on_new_category=self._add_category,
+                                                on_edit=self._note_edit))
         self.table.redraw()
         self._sync_columns_immediately()
 
@@ -943,7 +1455,7 @@ class MasterTableApp(Tk):
                 return
         adv_window = AdvancedFilterWindow(
             self, 
-            self.MasterTable,
+            self.view,
             disable_main_filters_callback=self.disable_simple_filters,
             enable_main_filters_callback=self.enable_simple_filters
         )
@@ -952,17 +1464,28 @@ class MasterTableApp(Tk):
         adv_window.focus_force()
 
     def clear_table(self):
+        if self._load_job is not None:
+            messagebox.showwarning("Loading", "Wait for the current load to finish or cancel it first.")
+            return
         if not self.has_data_loaded():
             self.show_no_data_message("clear the table")
             return
         if messagebox.askyesno("Confirm Clear", "Are you sure you want to clear all data from the table?"):
             self.MasterTable = pd.DataFrame()
             self.original_MasterTable = pd.DataFrame()
+            self.view = None
+            self.edits = EditOverlay()
+            self.summaries.clear()
             self.previous_columns = []
             self.vcf_headers = {}
             self.loaded_from_vcf = False
-            if hasattr(self, 'deleted_indices'):
-                del self.deleted_indices
+            self.memory_report = None
+            self.loaded_files = set()
+            self.active_filter_specs = None
+            self.active_regions = None
+            self.column_registry = ColumnRegistry()
+            self._close_store()
+            self.deleted_rows = None
             self.update_table()
             for sec in self.filter_sections:
                 sec['combobox'].set('')
@@ -988,43 +1511,6 @@ class MasterTableApp(Tk):
             self.table.model.df.to_csv(path, index=False, sep='\t')
             messagebox.showinfo("Success", "TSV file exported successfully.")
 
-    def _write_vcf_header(self, file_obj, header_source, available_fields=None):
-        if isinstance(header_source, dict):
-            file_obj.write(f"##fileformat={header_source['fileformat']}\n")
-            for info_id, info in header_source['infos'].items():
-                if available_fields is None or info_id in available_fields:
-                    file_obj.write(f"##INFO=<ID={info_id},Number={info.num},Type={info.type},Description=\"{info.desc}\">\n")
-            for fmt_id, fmt in header_source['formats'].items():
-                if available_fields is None or fmt_id in available_fields:
-                    file_obj.write(f"##FORMAT=<ID={fmt_id},Number={fmt.num},Type={fmt.type},Description=\"{fmt.desc}\">\n")
-            file_obj.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
-            if 'FORMAT' in (available_fields or []):
-                file_obj.write("\tFORMAT")
-                for sample in header_source['samples']:
-                    file_obj.write(f"\t{sample}")
-            file_obj.write("\n")
-        else:
-            file_obj.write(f"##fileformat={header_source.metadata.get('fileformat', 'VCFv4.2')}\n")
-            for info_id, info in header_source.infos.items():
-                if available_fields is None or info_id in available_fields:
-                    file_obj.write(f"##INFO=<ID={info_id},Number={info.num},Type={info.type},Description=\"{info.desc}\">\n")
-            for fmt_id, fmt in header_source.formats.items():
-                if available_fields is None or fmt_id in available_fields:
-                    file_obj.write(f"##FORMAT=<ID={fmt_id},Number={fmt.num},Type={fmt.type},Description=\"{fmt.desc}\">\n")
-            file_obj.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
-            if hasattr(header_source, 'samples') and len(header_source.samples) > 0 and ('FORMAT' in (available_fields or [])):
-                file_obj.write("\tFORMAT\tSAMPLE")
-            file_obj.write("\n")
-
-    def _get_vcf_value(self, row, field):
-        val = row.get(field, '.')
-        if pd.isna(val):
-            return '.'
-        return str(val)
-
-
-
-
     def export_to_vcf(self):
         if not self.has_data_loaded():
             self.show_no_data_message("export to VCF")
@@ -1043,195 +1529,12 @@ class MasterTableApp(Tk):
             return
         
         try:
-            current_columns = set(self.table.model.df.columns)
-            
-            samples = {}
-            sample_names = []
-            format_fields = set()  
-            
-            for fname, df in self.MasterTable.groupby("File_Name"):
-                sample_name = os.path.splitext(fname)[0].split('_')[-1]
-                sample_names.append(sample_name)
-                
-                visible_cols = [col for col in df.columns if col in current_columns]
-                samples[sample_name] = df[visible_cols]
-                
-                for col in visible_cols:
-                    if col in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
-                        continue
-                    if fname in self.vcf_headers:
-                        reader = self.vcf_headers[fname]
-                        if hasattr(reader, 'formats') and col in reader.formats:
-                            format_fields.add(col)
-                        elif hasattr(reader, 'infos') and col in reader.infos:
-                            continue  
-                        else:
-                            if any('|' in str(val) for val in df[col].dropna().head(5)):
-                                format_fields.add(col)
-
-            if len(samples) > 1:
-                with open(filepath, 'w') as vcf_out:
-                    vcf_out.write("##fileformat=VCF\n")
-                    
-                    for fname, reader in self.vcf_headers.items():
-                        if hasattr(reader, 'infos'):
-                            for info_id, info in reader.infos.items():
-                                if info_id in current_columns:
-                                    vcf_out.write(f"##INFO=<ID={info_id},Number={info.num},Type={info.type},Description=\"{info.desc}\">\n")
-                            break
-                    
-                    format_field_order = sorted([f for f in format_fields if f in current_columns])
-                    for field in format_field_order:
-                        field_spec = None
-                        for fname, reader in self.vcf_headers.items():
-                            if hasattr(reader, 'formats') and field in reader.formats:
-                                field_spec = reader.formats[field]
-                                break
-                        
-                        if field_spec:
-                            vcf_out.write(f"##FORMAT=<ID={field},Number={field_spec.num},Type={field_spec.type},Description=\"{field_spec.desc}\">\n")
-                        else:
-                            vcf_out.write(f"##FORMAT=<ID={field},Number=1,Type=String,Description=\"Unknown field {field}\">\n")
-                    
-                    vcf_out.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
-                    if format_field_order:  
-                        vcf_out.write("\tFORMAT")
-                        for sample in sample_names:
-                            vcf_out.write(f"\t{sample}")
-                    vcf_out.write("\n")
-                    
-                    all_positions = set()
-                    for sample_data in samples.values():
-                        for _, row in sample_data.iterrows():
-                            all_positions.add((row['Chrom'], row['Pos']))
-                    
-                    for chrom, pos in sorted(all_positions):
-                        variant_info = {}
-                        for sample in sample_names:
-                            sample_data = samples[sample]
-                            variant = sample_data[
-                                (sample_data['Chrom'] == chrom) & 
-                                (sample_data['Pos'] == pos)
-                            ]
-                            if not variant.empty:
-                                variant_info[sample] = variant.iloc[0]
-                        
-                        if not variant_info:
-                            continue
-                        
-                        first_var = next(iter(variant_info.values()))
-                        
-                        vid = first_var.get('ID', '.')
-                        ref = first_var.get('Ref', 'N')
-                        alt = first_var.get('Alt', '.')
-                        qual = first_var.get('Qual', '.')
-                        filt = first_var.get('Filter', 'PASS')
-                        
-                        info_fields = []
-                        for info_field in first_var.index:
-                            if info_field in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
-                                continue
-                            if info_field not in format_fields and not pd.isna(first_var[info_field]):
-                                info_fields.append(f"{info_field}={first_var[info_field]}")
-                        info = ';'.join(info_fields) if info_fields else '.'
-                        
-                        if format_field_order:
-                            sample_data_lines = []
-                            for sample in sample_names:
-                                if sample in variant_info:
-                                    var = variant_info[sample]
-                                    sample_data = []
-                                    for field in format_field_order:
-                                        val = var.get(field, '.')
-                                        if pd.isna(val):
-                                            sample_data.append('.')
-                                        else:
-                                            if '|' in str(val):
-                                                sample_data.append(str(val).split('|')[0])
-                                            else:
-                                                sample_data.append(str(val))
-                                    sample_data_lines.append(':'.join(sample_data))
-                                else:
-                                    sample_data_lines.append(':'.join(['.'] * len(format_field_order)))
-                        
-                        vcf_out.write(f"{chrom}\t{pos}\t{vid}\t{ref}\t{alt}\t{qual}\t{filt}\t{info}")
-                        if format_field_order:  
-                            vcf_out.write(f"\t{':'.join(format_field_order)}")
-                            for data in sample_data_lines:
-                                vcf_out.write(f"\t{data}")
-                        vcf_out.write("\n")
-            else:
-                self._export_single_sample_vcf(filepath, format_fields)
-            
+            write_vcf(filepath, self.MasterTable, self.vcf_headers, self.table.model.df.columns)
             messagebox.showinfo("Success", "VCF exported successfully!")
         
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export VCF:\n{str(e)}")
 
-    def _export_single_sample_vcf(self, filepath, format_fields=None):
-        with open(filepath, 'w') as vcf_out:
-            for fname, df in self.MasterTable.groupby("File_Name"):
-                if fname not in self.vcf_headers:
-                    continue
-                
-                current_columns = set(self.table.model.df.columns)
-                visible_cols = [col for col in df.columns if col in current_columns]
-                df = df[visible_cols]
-                
-                reader = self.vcf_headers[fname]
-                available_fields = set(df.columns)
-                
-                if format_fields is None:
-                    format_fields = set()
-                    if hasattr(reader, 'formats'):
-                        format_fields.update([f for f in reader.formats.keys() if f in available_fields])
-                    for col in available_fields:
-                        if col in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
-                            continue
-                        if col not in format_fields and any('|' in str(val) for val in df[col].dropna().head(5)):
-                            format_fields.add(col)
-                
-                format_fields = {f for f in format_fields if f in current_columns}
-                format_field_order = sorted(format_fields)
-                
-                self._write_vcf_header(vcf_out, reader, available_fields)
-                
-                for _, row in df.iterrows():
-                    chrom = self._get_vcf_value(row, 'Chrom')
-                    pos = self._get_vcf_value(row, 'Pos')
-                    vid = self._get_vcf_value(row, 'ID')
-                    ref = self._get_vcf_value(row, 'Ref')
-                    alt = self._get_vcf_value(row, 'Alt')
-                    qual = self._get_vcf_value(row, 'Qual')
-                    filt = self._get_vcf_value(row, 'Filter')
-                    
-                    info_fields = []
-                    for info_field in row.index:
-                        if info_field in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
-                            continue
-                        if info_field not in format_fields and not pd.isna(row[info_field]):
-                            info_fields.append(f"{info_field}={row[info_field]}")
-                    info = ';'.join(info_fields) if info_fields else '.'
-                    
-                    if format_field_order:
-                        sample_data = []
-                        for field in format_field_order:
-                            val = row.get(field, '.')
-                            if pd.isna(val):
-                                sample_data.append('.')
-                            else:
-                                if '|' in str(val):
-                                    sample_data.append(str(val).split('|')[0])
-                                else:
-                                    sample_data.append(str(val))
-                    
-                    vcf_out.write(f"{chrom}\t{pos}\t{vid}\t{ref}\t{alt}\t{qual}\t{filt}\t{info}")
-                    if format_field_order:  
-                        vcf_out.write(f"\t{':'.join(format_field_order)}\t{':'.join(sample_data)}")
-                    vcf_out.write("\n")
-
-
-
     def _parse_info_value(self, val):
         if pd.isna(val):
             return None
@@ -1240,5 +1543,7 @@ class MasterTableApp(Tk):
         return val
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = MasterTableApp()
     app.mainloop()
+    app._close_store()
@@ -0,0 +1,2648 @@
+"""Loading, filtering and export core of GenMasterTable, usable without Tk.
+
+The GUI in GenMasterTable.py is built on these functions; batch pipelines can
+import them directly or run this module as a command line:
+
+    python genmastertable_core.py a.vcf b.vcf --rules rules.yaml -o filtered.tsv
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+import pandas as pd
+import vcf
+from tqdm import tqdm
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+LOAD_WORKERS = int(os.environ.get("GENMASTERTABLE_WORKERS", "0")) or (os.cpu_count() or 1)
+LOAD_EXECUTOR = os.environ.get("GENMASTERTABLE_EXECUTOR", "process")
+VCF_BLOCK_ROWS = 200000
+VCF_FIXED_COLUMNS = ['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO']
+PARSER_VERSION = 1
+CACHE_DIR = os.environ.get("GENMASTERTABLE_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".genmastertable", "cache"))
+CACHE_MAX_MB = int(os.environ.get("GENMASTERTABLE_CACHE_MB", "4096"))
+OOC_CHUNK_ROWS = 250000
+OOC_PREVIEW_ROWS = 100000
+OOC_AUTO_MB = int(os.environ.get("GENMASTERTABLE_OOC_AUTO_MB", "0"))
+CATEGORY_MAX_RATIO = 0.5
+NUMERIC_TEXT_RATIO = 0.9
+SORTED_INDEX_MIN_ROWS = 50000
+SORTED_INDEX_OPS = ("equals", ">", ">=", "<", "<=")
+TEXT_OPS = ("contains", "does not contain", "starts with", "ends with")
+REGEX_CHARS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+INDEX_SEEK_MAX_FRACTION = 0.25
+FILTER_CACHE_MB = int(os.environ.get("GENMASTERTABLE_FILTER_CACHE_MB", "256"))
+FILTER_THREADS = int(os.environ.get("GENMASTERTABLE_FILTER_THREADS", "0")) or (os.cpu_count() or 1)
+PARALLEL_MIN_ROWS = 500000
+PARALLEL_MIN_BLOCK_ROWS = 65536
+COMPARE_UFUNCS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+SUMMARY_GROUP_COLUMNS = ("Gene", "Subject_ID", "Pedigree_ID", "ACMG_class")
+SUMMARY_CARRIER_COLUMNS = ("Subject_ID", "Sample", "File_Name")
+SUMMARY_CACHE_ENTRIES = 16
+VCF_COLUMN_NAMES = ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter']
+COLUMN_PROFILES_PATH = os.path.join(os.path.expanduser("~"), ".genmastertable", "column_profiles.json")
+
+
+class ParsedFileCache:
+    """Parquet copies of parsed input files, evicted least-recently-used first."""
+
+    HEADER_KEY = b'genmastertable.vcf_header'
+
+    def __init__(self, directory=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+
+    @staticmethod
+    def available():
+        return pq is not None and os.environ.get("GENMASTERTABLE_CACHE", "1") != "0"
+
+    def _entry(self, path, kind, columns=None):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{PARSER_VERSION}|{kind}"
+        if columns is not None:
+            key += "|" + json.dumps(sorted(columns))
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".parquet")
+
+    def _read(self, path, kind, columns):
+        entry = self._entry(path, kind, columns)
+        if not os.path.exists(entry) and columns is not None:
+            # a full entry of the same file serves any projection of it
+            entry = self._entry(path, kind)
+        if not os.path.exists(entry):
+            return None, None
+        read_columns = None
+        if columns is not None:
+            read_columns = [c for c in pq.read_schema(entry).names if c in columns or c == 'File_Name']
+        return entry, pq.read_table(entry, columns=read_columns)
+
+    def get(self, path, kind, columns=None):
+        try:
+            entry, table = self._read(path, kind, columns)
+        except (OSError, pa.ArrowException):
+            return None
+        if table is None:
+            return None
+        os.utime(entry)
+        df = table.to_pandas()
+        metadata = table.schema.metadata or {}
+        if self.HEADER_KEY in metadata:
+            df.attrs['vcf_header'] = metadata[self.HEADER_KEY].decode().split('\n')
+        return df
+
+    def put(self, path, kind, df, columns=None):
+        try:
+            entry = self._entry(path, kind, columns)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if df.attrs.get('vcf_header'):
+                metadata = dict(table.schema.metadata or {})
+                metadata[self.HEADER_KEY] = '\n'.join(df.attrs['vcf_header']).encode()
+                table = table.replace_schema_metadata(metadata)
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{entry}.{os.getpid()}.tmp"
+            pq.write_table(table, tmp)
+            os.replace(tmp, entry)
+        except (OSError, pa.ArrowException):
+            return
+        self._evict()
+
+    def _evict(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.parquet')]
+        except OSError:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        for e in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def delimited_header_columns(path, sep=','):
+    return pd.read_csv(path, sep=sep, nrows=0).columns.tolist()
+
+
+def read_delimited_file(path, sep=',', cache=None, columns=None):
+    kind = 'tsv' if sep == '\t' else 'csv'
+    df = cache.get(path, kind, columns) if cache else None
+    if df is not None:
+        return df
+    usecols = None if columns is None else (lambda c, wanted=set(columns): c in wanted)
+    df = pd.concat(pd.read_csv(path, sep=sep, usecols=usecols, chunksize=10**12, low_memory=False),
+                   ignore_index=True)
+    df["File_Name"] = os.path.basename(path)
+    if cache:
+        cache.put(path, kind, df, columns)
+    return df
+
+
+def load_column_profiles(path=COLUMN_PROFILES_PATH):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_column_profile(name, columns, path=COLUMN_PROFILES_PATH):
+    profiles = load_column_profiles(path)
+    profiles[name] = list(columns)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(profiles, fh, indent=2)
+    return profiles
+
+
+def _record_row(rec):
+    row = {
+        'Chrom': rec.CHROM,
+        'Pos': rec.POS,
+        'ID': rec.ID or '.',
+        'Ref': rec.REF,
+        'Alt': ','.join(map(str, rec.ALT)),
+        'Qual': rec.QUAL,
+        'Filter': ';'.join(rec.FILTER) if rec.FILTER else 'PASS',
+    }
+    for k, v in rec.INFO.items():
+        row[k] = _vcf_text(v)
+    return row
+
+
+def _vcf_text(val):
+    # PyVCF reads '.' as None; write it back as '.' so both parsers agree on missing values
+    if isinstance(val, (list, tuple)):
+        return ','.join(_vcf_text(v) for v in val)
+    return '.' if val is None else str(val)
+
+
+def _call_value(call, field):
+    if not hasattr(call.data, field):
+        return '.'
+    return _vcf_text(getattr(call.data, field))
+
+
+def iter_vcf_batches(reader, filename, batch_size=10**12):
+    batch = []
+    for rec in tqdm(reader, desc=filename):
+        row = _record_row(rec)
+        if rec.samples:
+            for field in rec.FORMAT.split(':'):
+                row[field] = '|'.join(_call_value(sample, field) for sample in rec.samples)
+
+        batch.append(row)
+
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def read_vcf_header(path):
+    header_lines = []
+    with _open_text(path) as fh:
+        for line in fh:
+            if line.startswith('##'):
+                header_lines.append(line.rstrip('\n'))
+                continue
+            if line.startswith('#CHROM'):
+                header_lines.append(line.rstrip('\n'))
+                return header_lines, line.rstrip('\n').split('\t')
+            break
+    raise ValueError("missing #CHROM header line")
+
+
+def vcf_header_columns(path):
+    header_lines, _ = read_vcf_header(path)
+    fields = []
+    for prefix in ('##INFO=<', '##FORMAT=<'):
+        for line in header_lines:
+            match = re.match(re.escape(prefix) + r'ID=([^,>]+)', line)
+            if match and match.group(1) not in fields:
+                fields.append(match.group(1))
+    return VCF_COLUMN_NAMES + fields
+
+
+def parse_regions(text):
+    regions = []
+    for token in re.split(r'[,\s]+', text.strip()):
+        if not token:
+            continue
+        match = re.fullmatch(r'([^:]+):([\d_]+)-([\d_]+)', token)
+        if not match:
+            raise ValueError(f"'{token}' is not a chr:start-end region")
+        start, end = int(match.group(2).replace('_', '')), int(match.group(3).replace('_', ''))
+        if start > end:
+            raise ValueError(f"'{token}' ends before it starts")
+        regions.append((match.group(1), start, end))
+    return regions
+
+
+def read_bed_regions(path, names=None):
+    wanted = {n.lower() for n in names} if names else None
+    regions = []
+    with _open_text(path) as fh:
+        for line in fh:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if wanted is not None and (len(fields) < 4 or fields[3].lower() not in wanted):
+                continue
+            regions.append((fields[0], int(fields[1]) + 1, int(fields[2])))
+    return regions
+
+
+def _chrom_key(name):
+    name = str(name)
+    return name[3:] if name[:3].lower() == 'chr' else name
+
+
+def genomic_columns(columns):
+    """(chrom, start, end) column names of a loaded table; end is None for point variants."""
+    columns = list(columns)
+    pick = lambda names: next((c for c in names if c in columns), None)
+    chrom, start = pick(['Chrom', 'Chr', 'CHROM', 'chrom', 'chr']), pick(['Pos', 'Start', 'POS', 'start'])
+    if chrom is None or start is None:
+        return None
+    return chrom, start, pick(['End', 'end', 'END'])
+
+
+def merge_regions(regions):
+    by_chrom = {}
+    for chrom, start, end in regions:
+        by_chrom.setdefault(_chrom_key(chrom), []).append((start, end))
+    merged = {}
+    for chrom, spans in by_chrom.items():
+        spans.sort()
+        out = [list(spans[0])]
+        for start, end in spans[1:]:
+            if start <= out[-1][1] + 1:
+                out[-1][1] = max(out[-1][1], end)
+            else:
+                out.append([start, end])
+        merged[chrom] = np.array(out, dtype='int64')
+    return merged
+
+
+class GenomicIntervalIndex:
+    """Rows grouped by chromosome and sorted by start, queried with binary search.
+
+    Rows overlap a region when start <= region end and end >= region start; the
+    longest row span per chromosome bounds how far left a query has to look.
+    """
+
+    def __init__(self, chroms, starts, ends=None):
+        if isinstance(chroms.dtype, pd.CategoricalDtype):
+            labels = pd.Series(chroms.cat.categories.map(_chrom_key), dtype=object)
+            codes = chroms.cat.codes.to_numpy()
+            key_codes, keys = pd.factorize(labels)
+            codes = np.where(codes < 0, -1, key_codes[np.maximum(codes, 0)])
+        else:
+            codes, keys = pd.factorize(chroms.map(_chrom_key, na_action='ignore'))
+        starts = pd.to_numeric(starts, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        ends = starts if ends is None else pd.to_numeric(ends, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        ends = np.where(np.isnan(ends), starts, ends)
+        valid = (codes >= 0) & ~np.isnan(starts)
+        self.n_rows = len(starts)
+        self.chroms = {}
+        rows = np.flatnonzero(valid)
+        order = rows[np.lexsort((starts[rows], codes[rows]))]
+        bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+        for k, key in enumerate(keys):
+            part = order[bounds[k]:bounds[k + 1]]
+            if len(part):
+                self.chroms[key] = (starts[part], ends[part], part, float((ends[part] - starts[part]).max()))
+
+    @classmethod
+    def from_frame(cls, frame):
+        chrom, start = frame.columns[0], frame.columns[1]
+        end = frame.columns[2] if len(frame.columns) > 2 else None
+        return cls(frame[chrom], frame[start], frame[end] if end is not None else None)
+
+    def positions(self, regions):
+        found = []
+        for chrom, spans in merge_regions(regions).items():
+            entry = self.chroms.get(chrom)
+            if entry is None:
+                continue
+            starts, ends, rows, max_span = entry
+            lo = np.searchsorted(starts, spans[:, 0] - max_span, 'left')
+            hi = np.searchsorted(starts, spans[:, 1], 'right')
+            lengths = hi - lo
+            if not lengths.sum():
+                continue
+            # candidate slices for all regions at once, then drop rows ending before their region
+            idx = np.repeat(lo - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+            keep = ends[idx] >= np.repeat(spans[:, 0], lengths)
+            found.append(rows[idx[keep]])
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(found))
+
+
+def region_mask(frame, regions):
+    mask = np.zeros(len(frame), dtype=bool)
+    mask[GenomicIntervalIndex.from_frame(frame).positions(regions)] = True
+    return mask
+
+
+def _read_bgzf_block(fh, coffset):
+    fh.seek(coffset)
+    header = fh.read(12)
+    if len(header) < 12:
+        return b'', None
+    xlen = struct.unpack('<H', header[10:12])[0]
+    extra = fh.read(xlen)
+    bsize = None
+    i = 0
+    while i + 4 <= len(extra):
+        sub_id, sub_len = extra[i:i + 2], struct.unpack('<H', extra[i + 2:i + 4])[0]
+        if sub_id == b'BC':
+            bsize = struct.unpack('<H', extra[i + 4:i + 6])[0]
+        i += 4 + sub_len
+    if bsize is None:
+        raise ValueError("not a BGZF file")
+    cdata = fh.read(bsize - xlen - 19)
+    fh.read(8)
+    return zlib.decompress(cdata, -15), coffset + bsize + 1
+
+
+def _reg2bins(beg, end, min_shift=14, depth=5):
+    bins = []
+    end -= 1
+    offset, shift = 0, min_shift + depth * 3
+    for level in range(depth + 1):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+        shift -= 3
+        offset += 1 << (level * 3)
+    return bins
+
+
+class TabixIndex:
+    """Reader for the .tbi/.csi index next to a bgzipped VCF."""
+
+    def __init__(self, index_path):
+        with gzip.open(index_path, 'rb') as fh:
+            data = fh.read()
+        magic = data[:4]
+        if magic == b'TBI\1':
+            self._parse_tbi(data)
+        elif magic == b'CSI\1':
+            self._parse_csi(data)
+        else:
+            raise ValueError(f"{os.path.basename(index_path)} is not a tabix or CSI index")
+
+    @classmethod
+    def find(cls, vcf_path):
+        for suffix in ('.tbi', '.csi'):
+            if os.path.exists(vcf_path + suffix):
+                return cls(vcf_path + suffix)
+        return None
+
+    def _parse_names(self, raw):
+        self.names = [n.decode() for n in raw.split(b'\0') if n]
+
+    def _parse_tbi(self, data):
+        self.min_shift, self.depth = 14, 5
+        n_ref, _fmt, _seq, _beg, _end, _meta, _skip, l_nm = struct.unpack_from('<8i', data, 4)
+        pos = 36
+        self._parse_names(data[pos:pos + l_nm])
+        pos += l_nm
+        self.refs = []
+        for _ in range(n_ref):
+            bins = {}
+            (n_bin,) = struct.unpack_from('<i', data, pos)
+            pos += 4
+            for _ in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from('<Ii', data, pos)
+                pos += 8
+                bins[bin_id] = list(struct.iter_unpack('<QQ', data[pos:pos + 16 * n_chunk]))
+                pos += 16 * n_chunk
+            (n_intv,) = struct.unpack_from('<i', data, pos)
+            pos += 4
+            linear = struct.unpack_from(f'<{n_intv}Q', data, pos)
+            pos += 8 * n_intv
+            self.refs.append((bins, linear))
+
+    def _parse_csi(self, data):
+        self.min_shift, self.depth, l_aux = struct.unpack_from('<3i', data, 4)
+        aux = data[16:16 + l_aux]
+        l_nm = struct.unpack_from('<i', aux, 24)[0] if l_aux >= 28 else 0
+        self._parse_names(aux[28:28 + l_nm])
+        pos = 16 + l_aux
+        (n_ref,) = struct.unpack_from('<i', data, pos)
+        pos += 4
+        self.refs = []
+        for _ in range(n_ref):
+            bins = {}
+            (n_bin,) = struct.unpack_from('<i', data, pos)
+            pos += 4
+            for _ in range(n_bin):
+                bin_id, _loffset, n_chunk = struct.unpack_from('<IQi', data, pos)
+                pos += 16
+                bins[bin_id] = list(struct.iter_unpack('<QQ', data[pos:pos + 16 * n_chunk]))
+                pos += 16 * n_chunk
+            self.refs.append((bins, ()))
+
+    def ref_name(self, chrom):
+        for candidate in (chrom, chrom[3:] if chrom.lower().startswith('chr') else 'chr' + chrom):
+            if candidate in self.names:
+                return candidate
+        return None
+
+    def chunks(self, chrom, start, end):
+        name = self.ref_name(chrom)
+        if name is None:
+            return []
+        bins, linear = self.refs[self.names.index(name)]
+        min_offset = 0
+        if linear:
+            min_offset = linear[min((start - 1) >> 14, len(linear) - 1)]
+        found = []
+        for bin_id in _reg2bins(start - 1, end, self.min_shift, self.depth):
+            found.extend(c for c in bins.get(bin_id, ()) if c[1] > min_offset)
+        return found
+
+
+def _merge_chunks(chunks):
+    merged = []
+    for beg, end in sorted(chunks):
+        if merged and beg <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([beg, end])
+    return merged
+
+
+def fetch_region_lines(path, regions, index=None):
+    """Return the VCF body lines overlapping any (chrom, start, end) region."""
+    index = index or TabixIndex.find(path)
+    if index is None:
+        raise ValueError(f"{os.path.basename(path)} has no .tbi or .csi index")
+    wanted = {}
+    chunks = []
+    for chrom, start, end in regions:
+        name = index.ref_name(chrom)
+        if name is None:
+            continue
+        wanted.setdefault(name, []).append((start, end))
+        chunks.extend(index.chunks(name, start, end))
+    lines = []
+    with open(path, 'rb') as fh:
+        for vbeg, vend in _merge_chunks(chunks):
+            coffset, cend = vbeg >> 16, vend >> 16
+            blocks = []
+            while coffset is not None and coffset <= cend:
+                block, next_offset = _read_bgzf_block(fh, coffset)
+                blocks.append(block[:vend & 0xFFFF] if coffset == cend else block)
+                coffset = next_offset
+            text = b''.join(blocks)[vbeg & 0xFFFF:].decode()
+            for line in text.splitlines():
+                fields = line.split('\t', 4)
+                if len(fields) < 4 or line.startswith('#'):
+                    continue
+                pos = int(fields[1])
+                last = pos + max(len(fields[3]), 1) - 1
+                if any(start <= last and pos <= end for start, end in wanted.get(fields[0], ())):
+                    lines.append(line)
+    return lines
+
+
+def _split_info_block(info, keys=None):
+    pairs = info.str.split(';').explode()
+    pairs = pairs[(pairs != '.') & (pairs != '') & pairs.notna()]
+    if pairs.empty:
+        return pd.DataFrame(index=info.index)
+    kv = pairs.str.partition('=')
+    if keys is not None:
+        kv = kv[kv[0].isin(keys)]
+    values = kv[2].where(kv[1] == '=', 'True')
+    long = pd.DataFrame({'row': kv.index, 'key': kv[0].values, 'value': values.values})
+    long = long.drop_duplicates(['row', 'key'], keep='last')
+    wide = long.pivot(index='row', columns='key', values='value')
+    wide.columns.name = None
+    return wide.reindex(index=info.index, columns=pd.unique(long['key']))
+
+
+def _split_fields(values, n_fields, sep=':', usecols=None):
+    # VCF lets a sample drop trailing FORMAT fields, so short rows are padded with '.'
+    split = values.str.split(sep, n=n_fields - 1, expand=True)
+    split = split.reindex(columns=usecols if usecols is not None else range(n_fields))
+    return split.fillna('.').replace('', '.')
+
+
+def _split_format_block(block, samples, wanted=None):
+    out = {}
+    for fmt in pd.unique(block['FORMAT']):
+        rows = block['FORMAT'] == fmt
+        keys = str(fmt).split(':')
+        used = [i for i, key in enumerate(keys) if wanted is None or key in wanted]
+        if not used:
+            continue
+        split = [_split_fields(block.loc[rows, sample], len(keys), usecols=used) for sample in samples]
+        for i in used:
+            key = keys[i]
+            joined = split[0][i]
+            for part in split[1:]:
+                joined = joined + '|' + part[i]
+            out.setdefault(key, []).append(joined)
+    return pd.DataFrame({key: pd.concat(parts) for key, parts in out.items()}, index=block.index)
+
+
+def _iter_vcf_blocks(path, name, block_rows=VCF_BLOCK_ROWS, regions=None, columns=None):
+    header_lines, header_columns = read_vcf_header(path)
+    if header_columns[:8] != VCF_FIXED_COLUMNS or len(header_columns) == 9:
+        raise ValueError("unexpected VCF column header")
+    samples = header_columns[9:]
+    source, skip = path, len(header_lines)
+    if regions is not None:
+        lines = fetch_region_lines(path, regions)
+        if not lines:
+            return
+        source, skip = io.StringIO('\n'.join(lines) + '\n'), 0
+    reader = pd.read_csv(source, sep='\t', header=None, names=header_columns, skiprows=skip,
+                         dtype=str, na_filter=False, quoting=csv.QUOTE_NONE, chunksize=block_rows)
+    with tqdm(desc=name, unit='rows') as progress:
+        for block in reader:
+            if samples and block[samples[-1]].isna().any():
+                raise ValueError("truncated sample columns")
+            qual = block['QUAL'].replace('.', None)
+            df = pd.DataFrame({
+                'Chrom': block['#CHROM'],
+                'Pos': pd.to_numeric(block['POS'], errors='raise'),
+                'ID': block['ID'],
+                'Ref': block['REF'],
+                'Alt': block['ALT'],
+                'Qual': pd.to_numeric(qual, errors='raise'),
+                'Filter': block['FILTER'].replace('.', 'PASS'),
+            })
+            if columns is not None:
+                df = df[[c for c in df.columns if c in columns]]
+            info = _split_info_block(block['INFO'], columns)
+            yield header_lines, samples, block, pd.concat([df, info], axis=1)
+            progress.update(len(block))
+
+
+def _add_format_columns(df, fmt):
+    shared = [c for c in fmt.columns if c in df.columns]
+    df = df.copy()
+    # like PyVCF, a FORMAT field only replaces the same-named INFO field on records that carry it
+    df[shared] = fmt[shared].where(fmt[shared].notna(), df[shared])
+    return pd.concat([df, fmt.drop(columns=shared)], axis=1)
+
+
+def fast_parse_vcf(path, name=None, block_rows=VCF_BLOCK_ROWS, regions=None, columns=None):
+    name = name or os.path.basename(path)
+    header_lines = None
+    frames = []
+    for header_lines, samples, block, df in _iter_vcf_blocks(path, name, block_rows, regions, columns):
+        if samples:
+            df = _add_format_columns(df, _split_format_block(block, samples, columns))
+        frames.append(df)
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    df.attrs['vcf_header'] = header_lines
+    return df
+
+
+def _project_columns(df, columns):
+    if columns is None or df is None:
+        return df
+    return df[[c for c in df.columns if c in columns or c == 'File_Name']]
+
+
+def read_vcf_file(path, name=None, cache=None, regions=None, columns=None):
+    name = name or os.path.basename(path)
+    if regions is not None:
+        df = fast_parse_vcf(path, name, regions=regions, columns=columns)
+        if df is not None:
+            df["File_Name"] = name
+        return df
+    df = cache.get(path, 'vcf', columns) if cache else None
+    if df is not None:
+        return df
+    try:
+        df = fast_parse_vcf(path, name, columns=columns)
+    except Exception:
+        vdfs = list(iter_vcf_batches(vcf.Reader(filename=path), name))
+        df = _project_columns(pd.concat(vdfs, ignore_index=True), columns) if vdfs else None
+        if df is not None:
+            try:
+                df.attrs['vcf_header'] = read_vcf_header(path)[0]
+            except ValueError:
+                pass
+    if df is None or df.empty:
+        return None
+    df["File_Name"] = name
+    if cache:
+        cache.put(path, 'vcf', df, columns)
+    return df
+
+
+def sample_file_name(path, sample):
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    return f"{base_name}_{sample}.vcf"
+
+
+def sample_header(header_lines, sample):
+    columns = header_lines[-1].split('\t')
+    return header_lines[:-1] + ['\t'.join(columns[:9] + [sample])]
+
+
+def _pyvcf_sample_frames(path, name):
+    reader = vcf.Reader(filename=path)
+    rows = {sample: [] for sample in reader.samples}
+    for rec in tqdm(reader, desc=name):
+        base = _record_row(rec)
+        fields = rec.FORMAT.split(':') if rec.FORMAT else []
+        for call in rec.samples:
+            row = dict(base)
+            for field in fields:
+                row[field] = _call_value(call, field)
+            rows[call.sample].append(row)
+    return {sample: pd.DataFrame(sample_rows) for sample, sample_rows in rows.items()}
+
+
+def read_multi_sample_vcf(path, cache=None, regions=None, columns=None):
+    """Read a multi-sample VCF once into a long (variant x sample) table.
+
+    Each sample's rows carry the File_Name the per-sample split files used to
+    have, so export still groups them into one VCF column per sample.
+    """
+    name = os.path.basename(path)
+    if regions is not None:
+        cache = None
+    df = cache.get(path, 'vcf-long', columns) if cache else None
+    if df is not None:
+        return df
+    try:
+        header_lines = None
+        per_sample = {}
+        for header_lines, samples, block, base in _iter_vcf_blocks(path, name, regions=regions, columns=columns):
+            for sample in samples:
+                fmt = _split_format_block(block, [sample], columns)
+                per_sample.setdefault(sample, []).append(_add_format_columns(base, fmt))
+        per_sample = {sample: pd.concat(parts, ignore_index=True) for sample, parts in per_sample.items()}
+    except Exception:
+        if regions is not None:
+            raise
+        per_sample = {sample: _project_columns(sample_df, columns)
+                      for sample, sample_df in _pyvcf_sample_frames(path, name).items()}
+        try:
+            header_lines = read_vcf_header(path)[0]
+        except ValueError:
+            header_lines = None
+    frames = []
+    for sample, sample_df in per_sample.items():
+        if not sample_df.empty:
+            sample_df["File_Name"] = sample_file_name(path, sample)
+            frames.append(sample_df)
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    if header_lines:
+        df.attrs['vcf_header'] = header_lines
+    if cache:
+        cache.put(path, 'vcf-long', df, columns)
+    return df
+
+
+def read_vcf_task(path, multi_sample=False, cache=None, regions=None, columns=None):
+    if multi_sample:
+        return read_multi_sample_vcf(path, cache, regions, columns)
+    return read_vcf_file(path, cache=cache, regions=regions, columns=columns)
+
+
+def reader_from_header(header_lines):
+    return vcf.Reader(fsock=io.StringIO('\n'.join(header_lines) + '\n'))
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+def map_files(func, tasks, *args, workers=1, executor="process", sink=None, cancel=None, progress=None):
+    """Run func(path, *args) for every task, keeping the input order.
+
+    A task is a path, or a tuple of leading arguments starting with the path.
+    Results are passed through sink(result) in input order when one is given,
+    and progress(files_done) is called after every file. Setting the cancel
+    event stops the run with LoadCancelled once the files in flight finish.
+    Returns (results, errors); a failed file yields None in results and a
+    (file name, message) pair in errors instead of aborting the whole merge.
+    """
+    tasks = [task if isinstance(task, tuple) else (task,) for task in tasks]
+    results = [None] * len(tasks)
+    errors = []
+
+    def collect(i, task, get_result):
+        if cancel is not None and cancel.is_set():
+            raise LoadCancelled()
+        try:
+            result = get_result()
+        except LoadCancelled:
+            raise
+        except Exception as e:
+            errors.append((os.path.basename(task[0]), str(e)))
+        else:
+            results[i] = sink(result) if sink is not None and result is not None else result
+        if progress is not None:
+            progress(i + 1)
+
+    if workers <= 1 or len(tasks) <= 1:
+        for i, task in enumerate(tasks):
+            collect(i, task, lambda: func(*task, *args))
+        return results, errors
+
+    def wait_for(future):
+        while True:
+            try:
+                return future.result(timeout=0.2)
+            except FutureTimeout:
+                if cancel is not None and cancel.is_set():
+                    raise LoadCancelled()
+
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    with pool_cls(max_workers=min(workers, len(tasks))) as pool:
+        futures = [pool.submit(func, *task, *args) for task in tasks]
+        try:
+            for i, (task, future) in enumerate(zip(tasks, futures)):
+                collect(i, task, lambda: wait_for(future))
+                futures[i] = None
+        except LoadCancelled:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    return results, errors
+
+
+class LoadJob:
+    """State shared between the Tk thread and a background load."""
+
+    def __init__(self, label, func, tasks, args=(), on_frame=None, clear_if_empty=False):
+        self.label = label
+        self.func = func
+        self.tasks = list(tasks)
+        self.args = args
+        self.on_frame = on_frame
+        self.clear_if_empty = clear_if_empty
+        self.store = None
+        self.append = False
+        self.cancel = threading.Event()
+        self.finished = threading.Event()
+        self.started = time.time()
+        self.files_done = 0
+        self.rows = 0
+        self.data = []
+        self.errors = []
+        self.vcf_headers = {}
+        self.status = None
+        self.message = ""
+
+
+class ChunkedTableStore:
+    """Merged table spilled to disk in row chunks and read back one chunk at a time."""
+
+    def __init__(self, chunk_rows=OOC_CHUNK_ROWS):
+        self.directory = tempfile.mkdtemp(prefix="genmastertable_")
+        self.chunk_rows = chunk_rows
+        self.chunks = []
+        self.columns = []
+        self.n_rows = 0
+        self.registry = ColumnRegistry()
+
+    def append(self, df):
+        if df is None or df.empty:
+            return
+        self.registry.add_chunk(df)
+        for start in range(0, len(df), self.chunk_rows):
+            part = df.iloc[start:start + self.chunk_rows].copy()
+            part.index = pd.RangeIndex(self.n_rows, self.n_rows + len(part))
+            path = os.path.join(self.directory, f"chunk_{len(self.chunks):06d}")
+            self.chunks.append((self._write(part, path), list(part.columns)))
+            self.columns.extend(c for c in part.columns if c not in self.columns)
+            self.n_rows += len(part)
+
+    def _write(self, part, path):
+        if pq is not None:
+            try:
+                pq.write_table(pa.Table.from_pandas(part, preserve_index=True), path + ".parquet")
+                return path + ".parquet"
+            except pa.ArrowException:
+                pass
+        part.to_pickle(path + ".pkl")
+        return path + ".pkl"
+
+    def _read(self, path, columns):
+        if path.endswith(".parquet"):
+            return pq.read_pandas(path, columns=columns).to_pandas()
+        return pd.read_pickle(path)[columns]
+
+    def iter_chunks(self, columns=None):
+        columns = list(self.columns if columns is None else columns)
+        for path, chunk_columns in self.chunks:
+            present = [c for c in columns if c in chunk_columns]
+            yield self._read(path, present).reindex(columns=columns)
+
+    def select(self, func, columns=None):
+        parts = [func(chunk) for chunk in self.iter_chunks(columns)]
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame(columns=list(self.columns if columns is None else columns))
+        return pd.concat(parts)
+
+    def head(self, n, columns=None):
+        parts = []
+        remaining = n
+        for chunk in self.iter_chunks(columns):
+            parts.append(chunk.iloc[:remaining])
+            remaining -= len(parts[-1])
+            if remaining <= 0:
+                break
+        return pd.concat(parts) if parts else pd.DataFrame(columns=self.columns)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.chunks = []
+
+
+def vcf_field_types(readers):
+    types = {}
+    for reader in readers:
+        for fields in (getattr(reader, 'infos', {}), getattr(reader, 'formats', {})):
+            for field_id, field in fields.items():
+                if field.type in ('Integer', 'Float'):
+                    types.setdefault(field_id, field.type)
+    return types
+
+
+def _downcast_numeric(series):
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        kind = 'unsigned' if len(series) and series.min() >= 0 else 'integer'
+        return pd.to_numeric(series, downcast=kind)
+    if pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+        narrow = series.astype(np.float32)
+        if np.array_equal(narrow.to_numpy(np.float64), series.to_numpy(np.float64), equal_nan=True):
+            return narrow
+    return series
+
+
+def _is_text(series):
+    """Object or string (pandas 3 ``str``) columns; categoricals are not text here."""
+    dtype = series.dtype
+    return not isinstance(dtype, pd.CategoricalDtype) and (
+        pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype))
+
+
+def infer_schema(df, field_types=None, category_ratio=CATEGORY_MAX_RATIO):
+    """Shrink a loaded frame: categoricals for repetitive text, the narrowest
+    lossless numeric dtypes, and numeric VCF fields typed from their header
+    declarations. Text that is mostly numbers (a multi-valued Number=A field
+    such as AF) stays text rather than becoming a categorical, so it still
+    compares as numbers. Returns the new frame and a per-column memory report.
+    """
+    field_types = field_types or {}
+    report = []
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        before = series.memory_usage(deep=True, index=False)
+        new = series
+        text = _is_text(series)
+        numeric_ratio = 0.0
+        if text:
+            present = series.notna() & (series != '.') & (series != '')
+            numeric = pd.to_numeric(series.where(present), errors='coerce')
+            n_present = int(present.sum())
+            numeric_ratio = numeric.notna().sum() / n_present if n_present else 0.0
+            if col in field_types and numeric_ratio == 1.0:
+                new = numeric
+        if pd.api.types.is_numeric_dtype(new):
+            new = _downcast_numeric(new)
+        elif text and numeric_ratio <= NUMERIC_TEXT_RATIO:
+            non_null = new.count()
+            if non_null and new.nunique(dropna=True) <= non_null * category_ratio:
+                new = new.astype('category')
+        converted[col] = new
+        report.append((col, str(series.dtype), str(new.dtype), before, new.memory_usage(deep=True, index=False)))
+    out = pd.DataFrame(converted, index=df.index)
+    out.attrs = dict(df.attrs)
+    report = pd.DataFrame(report, columns=['column', 'dtype_before', 'dtype_after', 'bytes_before', 'bytes_after'])
+    return out, report.set_index('column')
+
+
+def append_aligned(base, new):
+    """Concatenate new rows under base, keeping base's column order and
+    widening categoricals so shared columns stay categorical."""
+    base, new = base.copy(), new.copy()
+    for col in base.columns.union(new.columns, sort=False):
+        b = base[col] if col in base.columns else None
+        n = new[col] if col in new.columns else None
+        if not any(s is not None and isinstance(s.dtype, pd.CategoricalDtype) for s in (b, n)):
+            continue
+        if b is not None and n is not None and not all(
+                isinstance(s.dtype, pd.CategoricalDtype) or _is_text(s) for s in (b, n)):
+            continue
+        values = [s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else pd.Index(s.dropna().unique())
+                  for s in (b, n) if s is not None]
+        dtype = pd.CategoricalDtype(values[0].union(values[1], sort=False) if len(values) > 1 else values[0])
+        base[col] = b.astype(dtype) if b is not None else pd.Series(pd.Categorical([None] * len(base), dtype=dtype), index=base.index)
+        new[col] = n.astype(dtype) if n is not None else pd.Series(pd.Categorical([None] * len(new), dtype=dtype), index=new.index)
+    return pd.concat([base, new])
+
+
+def copy_on_write():
+    """True when pandas defers the copy of a selection until it is written to."""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except KeyError:
+        return False
+
+
+class TableView:
+    """The rows and columns of a base table that are on screen, kept as positions rather than a copy.
+
+    ``rows`` are sorted positions into ``base`` (None for every row) and ``columns`` the visible
+    column names. Filtering narrows the positions; only :meth:`frame` touches the data.
+    """
+
+    def __init__(self, base, rows=None, columns=None):
+        self.base = base
+        if rows is not None and len(rows) == len(base):
+            rows = None
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self.columns = list(base.columns) if columns is None else [c for c in columns if c in base.columns]
+
+    def __len__(self):
+        return len(self.base) if self.rows is None else len(self.rows)
+
+    def positions(self):
+        return np.arange(len(self.base)) if self.rows is None else self.rows
+
+    def narrow(self, rows):
+        """The view restricted to the base positions in ``rows``."""
+        if self.rows is not None:
+            rows = np.intersect1d(self.rows, rows, assume_unique=True)
+        return TableView(self.base, rows, self.columns)
+
+    def with_columns(self, columns):
+        return TableView(self.base, self.rows, columns)
+
+    def drop(self, deleted):
+        """The view without the base positions flagged in the boolean array ``deleted``."""
+        if deleted is None:
+            return self
+        rows = self.positions()
+        keep = ~deleted[rows]
+        return self if keep.all() else TableView(self.base, rows[keep], self.columns)
+
+    def frame(self):
+        """The visible rows and columns as a DataFrame for the table widget.
+
+        A filtered view costs one take of the visible cells; an unfiltered one shares the
+        base's column arrays when pandas copy-on-write is enabled.
+        """
+        cols = self.base.columns.get_indexer(self.columns)
+        if self.rows is not None:
+            return self.base.iloc[self.rows, cols]
+        if len(cols) == self.base.shape[1] and (cols == np.arange(len(cols))).all():
+            return self.base.copy(deep=not copy_on_write())
+        return self.base[self.columns]
+
+
+class EditOverlay:
+    """Cell edits keyed by (base row position, column), laid over a view's frame when it is built.
+
+    The base table is never written to, so re-filtering or clearing filters costs O(edits)
+    instead of copying edited values column by column between frames.
+    """
+
+    def __init__(self):
+        self.columns = {}
+
+    def __len__(self):
+        return sum(len(edits) for edits in self.columns.values())
+
+    def set(self, position, column, value):
+        self.columns.setdefault(column, {})[position] = value
+
+    def apply(self, view, frame):
+        """Write the edits that fall inside ``view`` into ``frame``, its materialised DataFrame."""
+        for column, edits in self.columns.items():
+            if column not in frame.columns or not edits:
+                continue
+            positions = np.fromiter(edits, dtype=np.int64, count=len(edits))
+            values = list(edits.values())
+            if view.rows is None:
+                rows = positions
+            else:
+                rows = np.searchsorted(view.rows, positions)
+                shown = rows < len(view.rows)
+                shown[shown] = view.rows[rows[shown]] == positions[shown]
+                rows, values = rows[shown], [v for v, keep in zip(values, shown) if keep]
+            if not len(rows):
+                continue
+            j = frame.columns.get_loc(column)
+            try:
+                frame.iloc[rows, j] = values
+            except (TypeError, ValueError):
+                series = frame[column].astype(object)
+                series.iloc[rows] = values
+                frame[column] = series
+        return frame
+
+
+class ColumnInfo:
+    """Type and summary statistics of one loaded column."""
+
+    __slots__ = ('dtype', 'kind', 'rows', 'nulls', 'cardinality', 'minimum', 'maximum')
+
+    def __init__(self, series):
+        self.dtype = series.dtype
+        self.rows = len(series)
+        self.nulls = int(series.isna().sum())
+        self.cardinality = int(series.nunique(dropna=True))
+        numeric = series
+        if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            values = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else series.dropna()
+            parsed = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes = series.cat.codes.to_numpy()
+                ok = parsed.notna().to_numpy()[codes[codes >= 0]]
+                numeric = pd.Series(parsed.to_numpy()[codes[codes >= 0]])
+            else:
+                ok = parsed.notna().to_numpy()
+                numeric = parsed
+            is_numeric = len(ok) > 0 and ok.mean() > NUMERIC_TEXT_RATIO
+        else:
+            is_numeric = True
+        self.kind = 'numeric' if is_numeric else 'text'
+        self.minimum = self.maximum = None
+        if is_numeric and numeric.notna().any():
+            self.minimum, self.maximum = numeric.min(), numeric.max()
+
+    def note_edit(self, old, new):
+        """Fold one cell edit into the statistics in O(1).
+
+        Null counts stay exact and min/max widen to cover the new value; the
+        cardinality, and bounds an edit may have shrunk, wait for a re-profile.
+        """
+        self.nulls += int(pd.isna(new)) - int(pd.isna(old))
+        if self.kind == 'numeric' and not pd.isna(new):
+            try:
+                value = float(new)
+            except (TypeError, ValueError):
+                return
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+
+class ColumnRegistry:
+    """Per-column types and statistics, profiled once per load instead of on every lookup."""
+
+    def __init__(self, df=None):
+        self.columns = {}
+        self.stale = {}
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df, columns=None):
+        for col in df.columns if columns is None else columns:
+            self.columns[col] = ColumnInfo(df[col])
+            self.stale.pop(col, None)
+
+    def add_chunk(self, df):
+        for col in df.columns:
+            info = ColumnInfo(df[col])
+            known = self.columns.get(col)
+            if known is None:
+                self.columns[col] = info
+                continue
+            known.rows += info.rows
+            known.nulls += info.nulls
+            known.cardinality = max(known.cardinality, info.cardinality)
+            for attr, pick in (('minimum', min), ('maximum', max)):
+                values = [v for v in (getattr(known, attr), getattr(info, attr)) if v is not None]
+                setattr(known, attr, pick(values) if values else None)
+
+    def get(self, col):
+        source = self.stale.pop(col, None)
+        if source is not None and col in self.columns:
+            self.columns[col] = ColumnInfo(source(col))
+        return self.columns.get(col)
+
+    def is_numeric(self, col):
+        info = self.get(col)
+        return info is not None and info.kind == 'numeric'
+
+    def keep(self, columns):
+        for col in set(self.columns) - set(columns):
+            del self.columns[col]
+            self.stale.pop(col, None)
+
+    def note_edit(self, col, old, new, source=None):
+        """Record a cell edit; ``source(col)`` returns the edited column for a lazy re-profile
+        on the next lookup, so any number of edits costs one rescan at most."""
+        info = self.columns.get(col)
+        if info is not None:
+            info.note_edit(old, new)
+            if source is not None:
+                self.stale[col] = source
+
+    def report(self):
+        for col in list(self.stale):
+            self.get(col)
+        rows = [(col, str(info.dtype), info.kind, info.nulls, info.cardinality, info.minimum, info.maximum)
+                for col, info in self.columns.items()]
+        return pd.DataFrame(rows, columns=['column', 'dtype', 'kind', 'nulls', 'cardinality', 'min', 'max'])
+
+
+def _as_mask(result):
+    if not isinstance(result, pd.Series):
+        return np.asarray(result, dtype=bool)
+    if result.dtype != bool:
+        result = result.fillna(False)
+    return result.to_numpy(dtype=bool)
+
+
+def numeric_values(series):
+    """A column as float64 numbers, NaN where a text or categorical value is not a number."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pd.Series(series.to_numpy(dtype='float64', na_value=np.nan), index=series.index)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = pd.to_numeric(pd.Series(series.cat.categories, dtype=object), errors='coerce')
+        lookup = np.append(categories.to_numpy(dtype='float64'), np.nan)
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(lookup[np.where(codes < 0, len(lookup) - 1, codes)], index=series.index)
+    return pd.to_numeric(series.astype(object), errors='coerce').astype('float64')
+
+
+def value_mask(series, items, is_numeric):
+    if is_numeric:
+        if not pd.api.types.is_numeric_dtype(series):
+            series = numeric_values(series)
+        return _as_mask(series.isin([x for x in items if x == x]))
+    return _as_mask(series.astype(str).str.lower().isin([str(x).lower() for x in items]))
+
+
+def parallel_mask(evaluate, n_rows, threads=1):
+    """Run evaluate(start, stop) over row blocks on a thread pool and stitch the block masks together.
+
+    Small tables, or threads <= 1, run as one block on the calling thread.
+    """
+    if threads <= 1 or n_rows < PARALLEL_MIN_ROWS:
+        return evaluate(0, n_rows)
+    # a few blocks per thread keeps the pool busy when blocks finish unevenly
+    block_rows = max(PARALLEL_MIN_BLOCK_ROWS, -(-n_rows // (threads * 4)))
+    starts = range(0, n_rows, block_rows)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        parts = list(pool.map(lambda start: evaluate(start, min(start + block_rows, n_rows)), starts))
+    return np.concatenate(parts)
+
+
+def rule_mask(series, op, val):
+    if op == "is empty":
+        return _as_mask(series.isna() | (series == ""))
+    if op == "is not empty":
+        return _as_mask(~series.isna() & (series != ""))
+    if op in TEXT_OPS:
+        return text_mask(series, op, val)
+    if (isinstance(val, (int, float)) and not isinstance(val, bool)
+            and not pd.api.types.is_numeric_dtype(series)):
+        # a numeric rule on a column the registry reads as numbers but that is stored as text
+        series = numeric_values(series)
+    if op == "equals":
+        return _as_mask(series == val)
+    if op == "not equals":
+        return _as_mask(series != val)
+    if (op in COMPARE_UFUNCS and isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iuf'
+            and isinstance(val, (int, float)) and not isinstance(val, bool)):
+        # plain NumPy ufunc: releases the GIL, so row blocks compare in parallel
+        return COMPARE_UFUNCS[op](series.to_numpy(), val)
+    if op == ">":
+        return _as_mask(series > val)
+    if op == ">=":
+        return _as_mask(series >= val)
+    if op == "<":
+        return _as_mask(series < val)
+    if op == "<=":
+        return _as_mask(series <= val)
+    return np.ones(len(series), dtype=bool)
+
+
+class TextValues:
+    """One column stringified once, the way rule_mask's text operators read it.
+
+    Literal patterns run on an Arrow string array when pyarrow is available, or
+    on a lowercased copy otherwise; only patterns with regex syntax go through
+    the per-element regex path. Each representation is built on first use.
+    Missing values never match: positive operators give False for them and
+    ``does not contain`` gives True.
+    """
+
+    def __init__(self, series):
+        missing = series.isna()
+        self.missing = missing.to_numpy(dtype=bool)
+        self.strings = series.astype(str).where(~missing)
+        self._arrow = None
+        self._lowered = None
+
+    def arrow(self):
+        if self._arrow is None:
+            self._arrow = pa.array(self.strings, type=pa.large_string(), from_pandas=True)
+        return self._arrow
+
+    def lowered(self):
+        if self._lowered is None:
+            self._lowered = self.strings.str.lower()
+        return self._lowered
+
+    def mask(self, op, val):
+        val = str(val)
+        if op in ("contains", "does not contain"):
+            if REGEX_CHARS.search(val):
+                hits = _as_mask(self.strings.str.contains(val, case=False, na=False))
+            elif pc is not None:
+                hits = self._arrow_mask(pc.match_substring(self.arrow(), val, ignore_case=True))
+            else:
+                hits = _as_mask(self.lowered().str.contains(val.lower(), regex=False, na=False))
+            hits = hits & ~self.missing
+            return ~hits if op == "does not contain" else hits
+        if pc is not None:
+            find = pc.starts_with if op == "starts with" else pc.ends_with
+            hits = self._arrow_mask(find(self.arrow(), val))
+        else:
+            find = self.strings.str.startswith if op == "starts with" else self.strings.str.endswith
+            hits = _as_mask(find(val, na=False))
+        return hits & ~self.missing
+
+    @staticmethod
+    def _arrow_mask(result):
+        return np.asarray(result.fill_null(False).to_numpy(zero_copy_only=False), dtype=bool)
+
+
+def text_mask(series, op, val):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # one evaluation per category, broadcast through the codes; missing values never match,
+        # as in TextValues, so the result does not depend on whether the column was categorised
+        labels = pd.Series(series.cat.categories.astype(str).tolist(), dtype=object)
+        positive = "contains" if op == "does not contain" else op
+        hits = np.append(TextValues(labels).mask(positive, val), False)
+        codes = series.cat.codes.to_numpy()
+        hits = hits[np.where(codes < 0, len(labels), codes)]
+        return ~hits if op == "does not contain" else hits
+    return TextValues(series).mask(op, val)
+
+
+class ValueIndex:
+    """Sorted row positions of every distinct key of one column."""
+
+    def __init__(self, codes, uniques):
+        codes = np.asarray(codes)
+        self.uniques = pd.Index(uniques)
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.uniques))
+        order = np.argsort(codes, kind='stable')
+        self.order = order[len(codes) - counts.sum():]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @classmethod
+    def for_text(cls, series):
+        # keys follow value_mask: str() of the value, lowercased, so missing values read as 'nan'
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            labels = series.cat.categories.astype(str).str.lower().tolist() + ['nan']
+            key_codes, keys = pd.factorize(pd.Series(labels, dtype=object))
+            codes = series.cat.codes.to_numpy()
+            return cls(key_codes[np.where(codes < 0, len(labels) - 1, codes)], keys)
+        return cls(*pd.factorize(series.astype(str).str.lower()))
+
+    @classmethod
+    def for_numeric(cls, series):
+        return cls(*pd.factorize(numeric_values(series)))
+
+    def positions(self, keys):
+        found = self.uniques.get_indexer(keys)
+        found = np.unique(found[found >= 0])
+        if not len(found):
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate([self.order[self.offsets[k]:self.offsets[k + 1]] for k in found]))
+
+
+class SortedIndex:
+    """Non-missing values of one numeric column in ascending order, with their row positions."""
+
+    def __init__(self, series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        order = np.argsort(values, kind='stable')
+        valid = int((~np.isnan(values)).sum())
+        self.order = order[:valid]
+        self.values = values[self.order]
+
+    def bounds(self, op, val):
+        n = len(self.values)
+        if op == ">":
+            return np.searchsorted(self.values, val, 'right'), n
+        if op == ">=":
+            return np.searchsorted(self.values, val, 'left'), n
+        if op == "<":
+            return 0, np.searchsorted(self.values, val, 'left')
+        if op == "<=":
+            return 0, np.searchsorted(self.values, val, 'right')
+        return np.searchsorted(self.values, val, 'left'), np.searchsorted(self.values, val, 'right')
+
+    def positions(self, lo, hi):
+        return np.sort(self.order[lo:hi])
+
+
+class FilterResultCache:
+    """LRU of filter results (row positions) keyed by the set of rules that produced them."""
+
+    def __init__(self, max_bytes=FILTER_CACHE_MB * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def put(self, key, rows):
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key).nbytes
+        if rows.nbytes > self.max_bytes:
+            return
+        self.entries[key] = rows
+        self.nbytes += rows.nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self.entries.popitem(last=False)[1].nbytes
+
+    def best_subset(self, key):
+        """The cached entry with the fewest rows whose rules are a subset of ``key``."""
+        best = None
+        for cached, rows in self.entries.items():
+            if cached <= key and (best is None or len(rows) < len(best[1])):
+                best = (cached, rows)
+        if best is None:
+            return frozenset(), None
+        self.entries.move_to_end(best[0])
+        return best
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+
+class TableIndexes:
+    """Lazily built value indexes over one frame, addressed by row position.
+
+    Positions refer to the frame they were built on (the unfiltered table), so
+    deleting rows from the view or filtering it leaves them valid.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.indexes = {}
+        self.sorted = {}
+        self.genomic = {}
+        self.text = {}
+        self.results = FilterResultCache()
+
+    @classmethod
+    def for_frame(cls, current, frame):
+        return current if current is not None and current.frame is frame else cls(frame)
+
+    def positions(self, col, items, is_numeric):
+        index = self.indexes.get((col, is_numeric))
+        if index is None:
+            build = ValueIndex.for_numeric if is_numeric else ValueIndex.for_text
+            index = self.indexes[(col, is_numeric)] = build(self.frame[col])
+        if is_numeric:
+            keys = np.asarray([x for x in items if x == x], dtype='float64')
+        else:
+            keys = [str(x).lower() for x in items]
+        return index.positions(keys)
+
+    def range_bounds(self, col, op, val):
+        """(index, lo, hi) for a numeric comparison rule, or None if it cannot be answered here."""
+        if op not in SORTED_INDEX_OPS or len(self.frame) < SORTED_INDEX_MIN_ROWS:
+            return None
+        series = self.frame[col]
+        if not pd.api.types.is_numeric_dtype(series) or isinstance(val, (str, bool)):
+            return None
+        index = self.sorted.get(col)
+        if index is None:
+            index = self.sorted[col] = SortedIndex(series)
+        return (index,) + index.bounds(op, val)
+
+    def text_mask(self, col, op, val):
+        series = self.frame[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return text_mask(series, op, val)
+        values = self.text.get(col)
+        if values is None:
+            values = self.text[col] = TextValues(series)
+        return values.mask(op, val)
+
+    def region_positions(self, columns, regions):
+        index = self.genomic.get(columns)
+        if index is None:
+            index = self.genomic[columns] = GenomicIntervalIndex.from_frame(self.frame[list(columns)])
+        return index.positions(regions)
+
+
+DEFAULT_SELECTIVITY = 0.5
+TEXT_OP_COST = 4.0
+REGEX_OP_COST = 20.0
+
+
+def predicate_estimate(registry, col, func, args):
+    """(selectivity, relative cost) of one predicate, guessed from the column statistics."""
+    info = registry.get(col) if registry is not None and not isinstance(col, tuple) else None
+    if info is None or func is region_mask:
+        return DEFAULT_SELECTIVITY, 1.0
+    distinct = max(info.cardinality, 1)
+    if func is value_mask:
+        return min(len(args[0]) / distinct, 1.0), 1.0
+    op, val = args
+    if op in TEXT_OPS:
+        return DEFAULT_SELECTIVITY, REGEX_OP_COST if REGEX_CHARS.search(str(val)) else TEXT_OP_COST
+    empty = info.nulls / info.rows if info.rows else 0.0
+    if op == "is empty":
+        return empty, 1.0
+    if op == "is not empty":
+        return 1.0 - empty, 1.0
+    if op == "equals":
+        return 1.0 / distinct, 1.0
+    if op == "not equals":
+        return 1.0 - 1.0 / distinct, 1.0
+    try:
+        value, lo, hi = float(val), float(info.minimum), float(info.maximum)
+    except (TypeError, ValueError):
+        return DEFAULT_SELECTIVITY, 1.0
+    # values assumed uniform between the column's min and max
+    above = (1.0 if value < lo else 0.0) if hi <= lo else min(max((hi - value) / (hi - lo), 0.0), 1.0)
+    return (above if op in (">", ">=") else 1.0 - above) * (1.0 - empty), 1.0
+
+
+def _filter_stats_report(stats):
+    rows = [(label, s[0] * 1000, s[1] / s[2] if s[2] else 0.0, s[3]) for label, s in stats.items()]
+    return pd.DataFrame(rows, columns=['rule', 'ms', 'selectivity', 'rows_left']).round(
+        {'ms': 2, 'selectivity': 4}).to_string(index=False)
+
+
+def _and_rank(estimate):
+    selectivity, cost = estimate
+    return cost / (1.0 - selectivity) if selectivity < 1.0 else float('inf')
+
+
+def _or_rank(estimate):
+    selectivity, cost = estimate
+    return cost / selectivity if selectivity > 0.0 else float('inf')
+
+
+class FilterPlan:
+    """Simple filters and advanced rules compiled into one AND-ed mask pass.
+
+    Every predicate reads its column straight from the source frame and the
+    matching rows are taken once at the end. Per-predicate timings and
+    selectivities accumulate in ``stats`` across calls (e.g. out-of-core chunks).
+    """
+
+    def __init__(self, indexes=None, threads=1):
+        self.predicates = []
+        self.stats = {}
+        self.indexes = indexes
+        self.threads = threads
+        self.reused = 0
+
+    @classmethod
+    def compile(cls, specs=None, rules=None, indexes=None, regions=None, registry=None, threads=1):
+        plan = cls(indexes, threads)
+        for col, items, is_numeric in specs or []:
+            plan.add(f"{col} in {items}", col, value_mask, items, is_numeric)
+        for col, op, val in rules or []:
+            plan.add(f"{col} {op} {val}".rstrip(), col, rule_mask, op, val)
+        for columns, targets in regions or []:
+            # a region predicate reads a (chrom, start[, end]) tuple of columns as one frame
+            plan.add(f"{columns[0]}:{columns[1]} in {len(targets)} region(s)", columns, region_mask, targets)
+        if registry is not None:
+            plan.order(registry)
+        return plan
+
+    def order(self, registry):
+        """Put cheap, selective predicates first so later ones see the fewest rows."""
+        self.predicates.sort(key=lambda p: _and_rank(predicate_estimate(registry, p[1], p[2], p[3])))
+
+    def add(self, label, column, func, *args):
+        self.predicates.append((label, column, func, args))
+        self.stats[label] = [0.0, 0, 0, 0]
+
+    @property
+    def columns(self):
+        names = []
+        for _, col, _, _ in self.predicates:
+            names.extend(col if isinstance(col, tuple) else [col])
+        return list(dict.fromkeys(names))
+
+    @staticmethod
+    def _column(df, col):
+        return df[list(col)] if isinstance(col, tuple) else df[col]
+
+    def mask(self, df):
+        """AND every predicate: index-served ones over the whole frame, the rest block by block."""
+        indexed = [p for p in self.predicates if self._indexed(df, p[2], p[3])]
+        scanned = [p for p in self.predicates if not self._indexed(df, p[2], p[3])]
+        base = self._and_into(np.ones(len(df), dtype=bool), df, indexed, self.stats)
+        if not scanned:
+            return base
+        columns = {label: self._column(df, col) for label, col, _, _ in scanned}
+        block_stats = []
+
+        def evaluate(start, stop):
+            stats = {label: [0.0, 0, 0, 0] for label, _, _, _ in scanned}
+            block = self._and_into(base[start:stop].copy(), None, scanned, stats,
+                                   lambda label: columns[label].iloc[start:stop])
+            block_stats.append(stats)
+            return block
+
+        mask = parallel_mask(evaluate, len(df), self.threads)
+        for stats in block_stats:
+            for label, values in stats.items():
+                self.stats[label] = [a + b for a, b in zip(self.stats[label], values)]
+        return mask
+
+    def _and_into(self, mask, df, predicates, stats, read=None):
+        for label, col, func, args in predicates:
+            stat = stats[label]
+            rows_in = int(mask.sum())
+            started = time.perf_counter()
+            if rows_in:
+                matched = self._evaluate(df, col, func, args) if read is None else func(read(label), *args)
+                mask &= matched
+                stat[1] += int(matched.sum())
+                stat[2] += len(mask)
+            stat[0] += time.perf_counter() - started
+            stat[3] += int(mask.sum())
+        return mask
+
+    def _indexed(self, df, func, args):
+        if self.indexes is None or self.indexes.frame is not df:
+            return False
+        return func in (value_mask, region_mask) or (func is rule_mask and args[0] in TEXT_OPS)
+
+    def _evaluate(self, df, col, func, args):
+        if func is rule_mask and args[0] in TEXT_OPS and self.indexes is not None and self.indexes.frame is df:
+            return self.indexes.text_mask(col, *args)
+        if func in (value_mask, region_mask) and self.indexes is not None and self.indexes.frame is df:
+            lookup = self.indexes.positions if func is value_mask else self.indexes.region_positions
+            matched = np.zeros(len(df), dtype=bool)
+            matched[lookup(col, *args)] = True
+            return matched
+        return func(self._column(df, col), *args)
+
+    def _seek(self, df):
+        """Start from the smallest index-answerable predicate, then verify the others on its rows only."""
+        if self.indexes is None or self.indexes.frame is not df:
+            return None
+        best = None
+        for i, (label, col, func, args) in enumerate(self.predicates):
+            started = time.perf_counter()
+            if func is value_mask:
+                found = self.indexes.positions(col, *args)
+                size = len(found)
+            elif func is region_mask:
+                found = self.indexes.region_positions(col, *args)
+                size = len(found)
+            elif func is rule_mask:
+                found = self.indexes.range_bounds(col, *args)
+                if found is None:
+                    continue
+                size = found[2] - found[1]
+            else:
+                continue
+            self.stats[label][0] += time.perf_counter() - started
+            if best is None or size < best[0]:
+                best = (size, i, found)
+        if best is None or best[0] > len(df) * INDEX_SEEK_MAX_FRACTION:
+            # a wide first step costs more in gathered positions than one mask pass
+            return None
+        _, first, found = best
+        if isinstance(found, tuple):
+            found = found[0].positions(found[1], found[2])
+        stats = self.stats[self.predicates[first][0]]
+        stats[1] += len(found)
+        stats[2] += len(df)
+        stats[3] += len(found)
+        return self._verify(df, found, [p for i, p in enumerate(self.predicates) if i != first])
+
+    def _verify(self, df, rows, predicates, on_step=None):
+        for label, col, func, args in predicates:
+            stats = self.stats[label]
+            started = time.perf_counter()
+            if len(rows):
+                matched = func(self._column(df, col).iloc[rows], *args)
+                stats[1] += int(matched.sum())
+                stats[2] += len(rows)
+                rows = rows[matched]
+            stats[0] += time.perf_counter() - started
+            stats[3] += len(rows)
+            if on_step is not None:
+                on_step((label, col, func, args), rows)
+        return rows
+
+    @staticmethod
+    def _key(predicate):
+        _, col, func, args = predicate
+        if func is value_mask:
+            items, is_numeric = args
+            return (col, func.__name__, frozenset(items), is_numeric)
+        if func is region_mask:
+            return (col, func.__name__, frozenset(args[0]))
+        return (col, func.__name__) + tuple(args)
+
+    def _scan(self, df):
+        rows = self._seek(df)
+        return np.flatnonzero(self.mask(df)) if rows is None else rows
+
+    def positions(self, df):
+        cache = self.indexes.results if self.indexes is not None and self.indexes.frame is df else None
+        if cache is None or not self.predicates:
+            return self._scan(df)
+        keys = {self._key(p): p for p in self.predicates}
+        cached, rows = cache.best_subset(frozenset(keys))
+        if rows is None:
+            rows = self._scan(df)
+            cache.put(frozenset(keys), rows)
+            return rows
+        self.reused = len(cached)
+        done = set(cached)
+
+        def remember(predicate, rows):
+            done.add(self._key(predicate))
+            cache.put(frozenset(done), rows)
+
+        return self._verify(df, rows, [p for key, p in keys.items() if key not in cached], remember)
+
+    def apply(self, df, columns=None):
+        rows = self.positions(df)
+        if columns is not None:
+            df = df[columns]
+        return df.iloc[rows] if len(rows) < len(df) else df.copy()
+
+    def report(self):
+        text = _filter_stats_report(self.stats)
+        if self.reused:
+            text += f"\n{self.reused} of {len(self.stats)} rule(s) served from the filter cache"
+        return text
+
+
+EXPRESSION_TOKENS = re.compile(r"""\s*(?:(>=|<=|!=|==|=|>|<)|([(),])|`([^`]*)`|"([^"]*)"|'([^']*)'|([^\s()<>=!,"'`]+))""")
+EXPRESSION_OPS = {'>': '>', '>=': '>=', '<': '<', '<=': '<=', '=': 'equals', '==': 'equals', '!=': 'not equals'}
+EXPRESSION_WORD_OPS = [("does", "not", "contain"), ("starts", "with"), ("ends", "with"),
+                       ("is", "not", "empty"), ("is", "empty"), ("contains",), ("in",)]
+
+
+def tokenize_expression(text):
+    tokens = []
+    text = text.rstrip()
+    pos = 0
+    while pos < len(text):
+        match = EXPRESSION_TOKENS.match(text, pos)
+        if not match:
+            raise ValueError(f"Cannot read the expression at '{text[pos:].strip()[:20]}'")
+        symbol, punct, backticked, double, single, word = match.groups()
+        if symbol is not None:
+            tokens.append(('op', symbol))
+        elif punct is not None:
+            tokens.append(('punct', punct))
+        elif word is not None:
+            tokens.append(('word', word))
+        else:
+            tokens.append(('text', next(q for q in (backticked, double, single) if q is not None)))
+        pos = match.end()
+    return tokens
+
+
+class _ExpressionParser:
+    """Recursive-descent parser: OR binds loosest, then AND, then NOT."""
+
+    def __init__(self, tokens, columns, registry=None):
+        self.tokens = tokens
+        self.pos = 0
+        self.columns = set(columns)
+        self.registry = registry
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def keyword(self, *words):
+        for i, word in enumerate(words):
+            kind, value = self.peek(i)
+            if kind != 'word' or value.lower() != word:
+                return False
+        self.pos += len(words)
+        return True
+
+    def expect(self, punct):
+        if self.take() != ('punct', punct):
+            raise ValueError(f"Expected '{punct}' in the expression")
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("The expression is empty.")
+        tree = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.peek()[1]}' in the expression")
+        return tree
+
+    def parse_or(self):
+        branches = [self.parse_and()]
+        while self.keyword('or'):
+            branches.append(self.parse_and())
+        return branches[0] if len(branches) == 1 else ('or', branches)
+
+    def parse_and(self):
+        branches = [self.parse_not()]
+        while self.keyword('and'):
+            branches.append(self.parse_not())
+        return branches[0] if len(branches) == 1 else ('and', branches)
+
+    def parse_not(self):
+        if self.keyword('not'):
+            return ('not', self.parse_not())
+        if self.peek() == ('punct', '('):
+            self.take()
+            tree = self.parse_or()
+            self.expect(')')
+            return tree
+        return self.parse_rule()
+
+    def value(self):
+        kind, value = self.take()
+        if kind not in ('word', 'text'):
+            raise ValueError("Expected a value in the expression")
+        return value
+
+    def number(self, col, val):
+        try:
+            return int(val)
+        except ValueError:
+            pass
+        try:
+            return float(val)
+        except ValueError:
+            raise ValueError(f"Column '{col}' is numeric but '{val}' is not.")
+
+    def parse_rule(self):
+        kind, col = self.take()
+        if kind not in ('word', 'text'):
+            raise ValueError("Expected a column name in the expression")
+        if col not in self.columns:
+            raise ValueError(f"Unknown column '{col}' (quote names with spaces in backticks)")
+        kind, symbol = self.peek()
+        if kind == 'op':
+            self.pos += 1
+            op = EXPRESSION_OPS[symbol]
+        else:
+            op = next((' '.join(words) for words in EXPRESSION_WORD_OPS if self.keyword(*words)), None)
+            if op is None:
+                raise ValueError(f"Expected an operator after '{col}'")
+        if op in ("is empty", "is not empty"):
+            return ('rule', (f"{col} {op}", col, rule_mask, (op, "")))
+        info = self.registry.get(col) if self.registry is not None else None
+        if op == "in":
+            self.expect('(')
+            items = [self.value()]
+            while self.peek() == ('punct', ','):
+                self.take()
+                items.append(self.value())
+            self.expect(')')
+            is_numeric = info is not None and info.kind == 'numeric'
+            if is_numeric:
+                items = [self.number(col, x) for x in items]
+            return ('rule', (f"{col} in {items}", col, value_mask, (items, is_numeric)))
+        val = self.value()
+        if info is not None and info.kind == 'numeric':
+            val = self.number(col, val)
+        return ('rule', (f"{col} {op} {val}", col, rule_mask, (op, val)))
+
+
+class FilterExpression:
+    """Rules combined with AND, OR, NOT and parentheses.
+
+    For example ``(CADD > 25 OR REVEL > 0.7) AND gnomAD_AF < 0.001``; column
+    names with spaces go in backticks and ``Gene in (BRCA1, BRCA2)`` is a list
+    filter. Every node works on the row positions still in play: AND runs its
+    cheapest, most selective branch first, and each OR branch only sees the rows
+    no earlier branch matched. Estimates come from the column registry.
+    """
+
+    def __init__(self, tree, indexes=None, registry=None, threads=1):
+        self.tree = tree
+        self.indexes = indexes
+        self.registry = registry
+        self.threads = threads
+        self.stats = {}
+        self.reused = False
+
+    @classmethod
+    def parse(cls, text, columns, registry=None, indexes=None, threads=1):
+        tree = _ExpressionParser(tokenize_expression(text), columns, registry).parse()
+        return cls(tree, indexes, registry, threads)
+
+    def _leaves(self, tree):
+        kind, body = tree
+        if kind == 'rule':
+            return [body]
+        if kind == 'not':
+            return self._leaves(body)
+        return [leaf for branch in body for leaf in self._leaves(branch)]
+
+    @property
+    def columns(self):
+        return list(dict.fromkeys(col for _, col, _, _ in self._leaves(self.tree)))
+
+    def _estimate(self, tree):
+        kind, body = tree
+        if kind == 'rule':
+            return predicate_estimate(self.registry, body[1], body[2], body[3])
+        if kind == 'not':
+            selectivity, cost = self._estimate(body)
+            return 1.0 - selectivity, cost
+        cost, reach = 0.0, 1.0
+        for selectivity, branch_cost in sorted(map(self._estimate, body), key=_and_rank if kind == 'and' else _or_rank):
+            cost += branch_cost * reach
+            reach *= selectivity if kind == 'and' else 1.0 - selectivity
+        return (reach if kind == 'and' else 1.0 - reach), cost
+
+    def _ordered(self, kind, branches):
+        rank = _and_rank if kind == 'and' else _or_rank
+        return sorted(branches, key=lambda branch: rank(self._estimate(branch)))
+
+    def _whole(self, df, col, func, args):
+        indexes = self.indexes if self.indexes is not None and self.indexes.frame is df else None
+        if indexes is not None:
+            if func is value_mask:
+                return indexes.positions(col, *args)
+            found = indexes.range_bounds(col, *args)
+            if found is not None:
+                return found[0].positions(found[1], found[2])
+            if args[0] in TEXT_OPS:
+                return np.flatnonzero(indexes.text_mask(col, *args))
+        series = df[col]
+        return np.flatnonzero(parallel_mask(lambda start, stop: func(series.iloc[start:stop], *args),
+                                            len(df), self.threads))
+
+    def _leaf(self, df, predicate, rows):
+        label, col, func, args = predicate
+        stats = self.stats.setdefault(label, [0.0, 0, 0, 0])
+        started = time.perf_counter()
+        if len(rows) == len(df):
+            found = self._whole(df, col, func, args)
+        else:
+            found = rows[func(df[col].iloc[rows], *args)]
+        stats[0] += time.perf_counter() - started
+        stats[1] += len(found)
+        stats[2] += len(rows)
+        stats[3] += len(found)
+        return found
+
+    def _rows(self, df, tree, rows):
+        kind, body = tree
+        if kind == 'rule':
+            return self._leaf(df, body, rows)
+        if kind == 'not':
+            return np.setdiff1d(rows, self._rows(df, body, rows), assume_unique=True)
+        if kind == 'and':
+            for branch in self._ordered(kind, body):
+                if not len(rows):
+                    break
+                rows = self._rows(df, branch, rows)
+            return rows
+        matched, rest = [], rows
+        for branch in self._ordered(kind, body):
+            if not len(rest):
+                break
+            found = self._rows(df, branch, rest)
+            matched.append(found)
+            rest = np.setdiff1d(rest, found, assume_unique=True)
+        return np.sort(np.concatenate(matched)) if matched else rows[:0]
+
+    def positions(self, df):
+        cache = self.indexes.results if self.indexes is not None and self.indexes.frame is df else None
+        key = frozenset([('expression', repr(self.tree))])
+        if cache is not None:
+            _, rows = cache.best_subset(key)
+            if rows is not None:
+                self.reused = True
+                return rows
+        rows = self._rows(df, self.tree, np.arange(len(df)))
+        if cache is not None:
+            cache.put(key, rows)
+        return rows
+
+    def apply(self, df, columns=None):
+        rows = self.positions(df)
+        if columns is not None:
+            df = df[columns]
+        return df.iloc[rows] if len(rows) < len(df) else df.copy()
+
+    def report(self):
+        if self.reused:
+            return "expression served from the filter cache"
+        return _filter_stats_report(self.stats)
+
+
+
+RULE_OPERATORS = ("equals", "not equals", "contains", "does not contain", "starts with", "ends with",
+                  ">", ">=", "<", "<=", "is empty", "is not empty")
+RULE_SET_KEYS = ("filters", "rules", "expression", "regions", "bed", "genes")
+
+
+def typed_list_filter(col, items, registry=None):
+    """(col, items, is_numeric) for a list filter; items become numbers on numeric columns."""
+    info = registry.get(col) if registry is not None else None
+    is_numeric = info is not None and info.kind == 'numeric'
+    if not is_numeric:
+        return col, list(items), False
+    numeric_items = []
+    for x in items:
+        try:
+            num_val = float(x)
+        except (TypeError, ValueError):
+            raise ValueError(f"Column '{col}' contains numeric data but filter value '{x}' is not numeric.")
+        if '.' not in str(x) and pd.api.types.is_integer_dtype(info.dtype):
+            num_val = int(num_val)
+        numeric_items.append(num_val)
+    return col, numeric_items, True
+
+
+def typed_rule(col, op, val, registry=None):
+    """(col, op, val) for a threshold rule; text values become numbers on numeric columns."""
+    if op in ("is empty", "is not empty") or not isinstance(val, str):
+        return col, op, val
+    info = registry.get(col) if registry is not None else None
+    if info is not None and info.kind == 'numeric':
+        try:
+            val = float(val) if "." in val else int(val)
+        except ValueError:
+            raise ValueError(f"Column '{col}' is numeric but '{val}' is not.")
+    return col, op, val
+
+
+def new_rule_set():
+    return {'filters': [], 'rules': [], 'expression': None, 'regions': [], 'bed': None, 'genes': []}
+
+
+def check_rule_set(data):
+    """Validate a parsed rule set and fill in the keys it leaves out."""
+    if not isinstance(data, dict):
+        raise ValueError("A rule set must be a mapping of filters, rules, expression and regions.")
+    unknown = set(data) - set(RULE_SET_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown rule set key(s): {', '.join(sorted(unknown))}")
+    rule_set = new_rule_set()
+    rule_set.update({key: value for key, value in data.items() if value is not None})
+    for item in rule_set['filters']:
+        if not isinstance(item, dict) or 'column' not in item or not isinstance(item.get('values'), list):
+            raise ValueError("Each list filter needs a column and a list of values.")
+    for rule in rule_set['rules']:
+        if not isinstance(rule, dict) or 'column' not in rule or rule.get('operator') not in RULE_OPERATORS:
+            raise ValueError(f"Each rule needs a column and one of these operators: {', '.join(RULE_OPERATORS)}")
+        if rule['operator'] not in ("is empty", "is not empty") and 'value' not in rule:
+            raise ValueError(f"Rule on '{rule['column']}' {rule['operator']} has no value.")
+    if rule_set['expression'] is not None and not isinstance(rule_set['expression'], str):
+        raise ValueError("The expression must be a string.")
+    parse_regions(' '.join(rule_set['regions']))
+    return rule_set
+
+
+def load_rule_set(path):
+    """Read a JSON or YAML (.yml/.yaml) rule set; a relative BED path is resolved against the file."""
+    with open(path) as fh:
+        text = fh.read()
+    if path.lower().endswith(('.yml', '.yaml')):
+        if yaml is None:
+            raise ValueError("Reading YAML rule sets needs PyYAML; save the rule set as JSON instead.")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Cannot read {os.path.basename(path)}: {e}")
+    else:
+        data = json.loads(text)
+    rule_set = check_rule_set(data)
+    if rule_set['bed'] and not os.path.isabs(rule_set['bed']):
+        rule_set['bed'] = os.path.join(os.path.dirname(os.path.abspath(path)), rule_set['bed'])
+    return rule_set
+
+
+def save_rule_set(path, rule_set):
+    data = {key: value for key, value in check_rule_set(rule_set).items() if value}
+    with open(path, 'w') as fh:
+        if path.lower().endswith(('.yml', '.yaml')):
+            if yaml is None:
+                raise ValueError("Writing YAML rule sets needs PyYAML; save the rule set as JSON instead.")
+            yaml.safe_dump(data, fh, sort_keys=False)
+        else:
+            json.dump(data, fh, indent=2)
+
+
+def rule_set_regions(rule_set):
+    regions = parse_regions(' '.join(rule_set['regions']))
+    if rule_set['bed']:
+        bed_regions = read_bed_regions(rule_set['bed'], rule_set['genes'] or None)
+        if rule_set['genes'] and not bed_regions:
+            raise ValueError("None of the gene symbols were found in the BED file.")
+        regions.extend(bed_regions)
+    return regions
+
+
+class CompiledRuleSet:
+    """A rule set's FilterPlan ANDed with its FilterExpression, used like a FilterPlan."""
+
+    def __init__(self, plan, expression=None):
+        self.plan = plan
+        self.expression = expression
+
+    @property
+    def columns(self):
+        extra = self.expression.columns if self.expression is not None else []
+        return list(dict.fromkeys(self.plan.columns + extra))
+
+    def positions(self, df):
+        if self.expression is None:
+            return self.plan.positions(df)
+        rows = self.expression.positions(df)
+        if self.plan.predicates:
+            rows = np.intersect1d(self.plan.positions(df), rows, assume_unique=True)
+        return rows
+
+    def apply(self, df, columns=None):
+        rows = self.positions(df)
+        if columns is not None:
+            df = df[columns]
+        return df.iloc[rows] if len(rows) < len(df) else df.copy()
+
+    def report(self):
+        parts = [self.plan.report()] if self.plan.predicates else []
+        if self.expression is not None:
+            parts.append(self.expression.report())
+        return "\n".join(parts)
+
+
+def compile_rule_set(rule_set, columns, registry=None, indexes=None, threads=1):
+    """Compile a rule set against a table with these columns; raises ValueError for rules that cannot run."""
+    columns = list(columns)
+    for col in [f['column'] for f in rule_set['filters']] + [r['column'] for r in rule_set['rules']]:
+        if col not in columns:
+            raise ValueError(f"Unknown column '{col}'")
+    specs = [typed_list_filter(f['column'], f['values'], registry) for f in rule_set['filters']]
+    rules = [typed_rule(r['column'], r['operator'], r.get('value', ""), registry) for r in rule_set['rules']]
+    regions = None
+    targets = rule_set_regions(rule_set)
+    if targets:
+        genomic = genomic_columns(columns)
+        if genomic is None:
+            raise ValueError("Region filtering needs a chromosome column (Chrom/Chr) and a position column (Pos/Start).")
+        regions = [(tuple(c for c in genomic if c), targets)]
+    plan = FilterPlan.compile(specs=specs, rules=rules, indexes=indexes, regions=regions, registry=registry,
+                              threads=threads)
+    expression = None
+    if rule_set['expression'] and rule_set['expression'].strip():
+        expression = FilterExpression.parse(rule_set['expression'], columns, registry, indexes, threads)
+    return CompiledRuleSet(plan, expression)
+
+
+def filter_table(df, rule_set, registry=None, indexes=None, threads=FILTER_THREADS):
+    """Apply a rule set to a loaded table; returns the matching rows and the per-rule report."""
+    registry = registry if registry is not None else ColumnRegistry(df)
+    compiled = compile_rule_set(rule_set, df.columns, registry, indexes, threads)
+    return compiled.apply(df), compiled.report()
+
+
+def summary_columns(columns):
+    """The usual cohort group-by columns and the carrier (subject) column among ``columns``."""
+    by_name = {str(c).lower(): c for c in columns}
+    keys = [by_name[c.lower()] for c in SUMMARY_GROUP_COLUMNS if c.lower() in by_name]
+    carrier = next((by_name[c.lower()] for c in SUMMARY_CARRIER_COLUMNS if c.lower() in by_name), None)
+    return keys, carrier
+
+
+class GroupSummary:
+    """Variant counts, carrier counts and score aggregates per group over a view's rows.
+
+    Rows are grouped once; deleting rows recomputes only the groups they belonged to.
+    """
+
+    def __init__(self, frame, rows, keys, carrier=None, scores=()):
+        self.keys = list(keys)
+        self.carrier = carrier
+        self.scores = [s for s in scores if s not in self.keys and s != carrier]
+        self.rows = np.asarray(rows, dtype=np.int64)
+        grouper = frame.groupby(self.keys, sort=True, dropna=False, observed=True)
+        self.labels = grouper.size().index
+        self.codes = grouper.ngroup().to_numpy()
+        if carrier is not None:
+            codes = pd.factorize(frame[carrier])[0]
+            self.carriers = np.where(codes < 0, np.nan, codes)
+        self.values = {s: pd.to_numeric(frame[s], errors='coerce').to_numpy(dtype=float) for s in self.scores}
+        self.order = np.argsort(self.codes, kind='stable')
+        self.starts = np.searchsorted(self.codes[self.order], np.arange(len(self.labels) + 1))
+        self.alive = np.ones(len(self.rows), dtype=bool)
+        self.result = self._aggregate(np.arange(len(self.rows)))
+
+    @classmethod
+    def from_view(cls, view, keys, carrier=None, scores=(), edits=None):
+        """Summarise a TableView, reading only the key, carrier and score columns."""
+        columns = list(dict.fromkeys(list(keys) + ([carrier] if carrier else []) + list(scores)))
+        view = view.with_columns(columns)
+        frame = view.frame()
+        if edits is not None and len(edits):
+            frame = edits.apply(view, frame)
+        return cls(frame, view.positions(), keys, carrier, scores)
+
+    def _aggregate(self, idx):
+        data = {'group': self.codes[idx]}
+        if self.carrier is not None:
+            data['carrier'] = self.carriers[idx]
+        for s in self.scores:
+            data[s] = self.values[s][idx]
+        grouped = pd.DataFrame(data).groupby('group', sort=True)
+        out = grouped.size().to_frame('Variants')
+        if self.carrier is not None:
+            out['Carriers'] = grouped['carrier'].nunique()
+        for s in self.scores:
+            stats = grouped[s].agg(['min', 'max', 'mean'])
+            for stat in stats.columns:
+                out[f"{s}_{stat}"] = stats[stat]
+        return out
+
+    def delete(self, positions):
+        """Drop deleted base positions; returns whether any of them were summarised."""
+        positions = np.asarray(positions, dtype=np.int64)
+        i = np.searchsorted(self.rows, positions)
+        found = i < len(self.rows)
+        found[found] = self.rows[i[found]] == positions[found]
+        i = i[found]
+        i = i[self.alive[i]]
+        if not len(i):
+            return False
+        self.alive[i] = False
+        affected = np.unique(self.codes[i])
+        idx = np.concatenate([self.order[self.starts[g]:self.starts[g + 1]] for g in affected])
+        fresh = self._aggregate(idx[self.alive[idx]])
+        self.result = pd.concat([self.result.drop(index=affected), fresh]).sort_index()
+        return True
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def table(self):
+        """One row per group, largest groups first."""
+        out = self.result.copy()
+        out.index = self.labels.take(np.asarray(out.index, dtype=np.int64))
+        return out.sort_values('Variants', ascending=False, kind='stable').reset_index()
+
+
+class SummaryCache:
+    """GroupSummary results keyed by (group keys, carrier, scores, filter version).
+
+    Entries of an older filter version are dropped; row deletions are folded into the
+    cached summaries instead of invalidating them.
+    """
+
+    def __init__(self, max_entries=SUMMARY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    @staticmethod
+    def key(keys, carrier, scores, version):
+        return (tuple(keys), carrier, tuple(scores), version)
+
+    def get(self, key):
+        summary = self.entries.get(key)
+        if summary is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return summary
+
+    def put(self, key, summary):
+        for stale in [k for k in self.entries if k[-1] != key[-1]]:
+            del self.entries[stale]
+        self.entries[key] = summary
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def delete_rows(self, positions):
+        for summary in self.entries.values():
+            summary.delete(positions)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def register_vcf_header(df, vcf_headers, readers=None):
+    """Record a PyVCF reader per File_Name of a parsed VCF frame, for typing and export."""
+    header_lines = df.attrs.get('vcf_header')
+    names = df["File_Name"].unique()
+    if len(names) > 1 and header_lines:
+        samples = sorted(header_lines[-1].split('\t')[9:], key=len, reverse=True)
+        for name in names:
+            sample = next(s for s in samples if name.endswith(f"_{s}.vcf"))
+            vcf_headers[name] = reader_from_header(sample_header(header_lines, sample))
+    elif header_lines:
+        vcf_headers[names[0]] = reader_from_header(header_lines)
+    elif readers and names[0] in readers:
+        vcf_headers[names[0]] = readers[names[0]]
+
+
+def input_kind(paths):
+    """The shared extension of the input files ('.csv', '.tsv', '.vcf' or '.gz')."""
+    kinds = {os.path.splitext(p)[1].lower() for p in paths}
+    if len(kinds) > 1:
+        raise ValueError("Cannot mix different file types.")
+    kind = kinds.pop() if kinds else None
+    if kind not in (".csv", ".tsv", ".vcf", ".gz"):
+        raise ValueError("Unsupported file type.")
+    return kind
+
+
+def load_table(paths, cache=None, columns=None, regions=None, workers=LOAD_WORKERS, executor=LOAD_EXECUTOR):
+    """Load and merge CSV, TSV or VCF files the way the GUI does, without asking questions.
+
+    Multi-sample VCFs are always split into one row per sample. Returns
+    (table, vcf_headers, errors) where vcf_headers maps File_Name to a PyVCF
+    reader and errors lists the (file name, message) pairs that failed.
+    """
+    kind = input_kind(paths)
+    vcf_headers = {}
+    readers = {}
+    errors = []
+    if kind in (".csv", ".tsv"):
+        func, tasks, args = read_delimited_file, list(paths), (',' if kind == ".csv" else '\t', cache, columns)
+    else:
+        func, tasks, args = read_vcf_task, [], ()
+        for path in paths:
+            try:
+                reader = vcf.Reader(filename=path)
+            except Exception as e:
+                errors.append((os.path.basename(path), str(e)))
+                continue
+            multi_sample = len(reader.samples) > 1
+            if not multi_sample:
+                readers[os.path.basename(path)] = reader
+            tasks.append((path, multi_sample, cache, regions, columns))
+
+    def sink(df):
+        if kind not in (".csv", ".tsv"):
+            register_vcf_header(df, vcf_headers, readers)
+        return df
+
+    results, failed = map_files(func, tasks, *args, workers=workers, executor=executor, sink=sink)
+    errors.extend(failed)
+    data = [df for df in results if df is not None]
+    if not data:
+        return pd.DataFrame(), vcf_headers, errors
+    merged = pd.concat(data, ignore_index=True)
+    data.clear()
+    field_types = vcf_field_types(vcf_headers.values()) if kind not in (".csv", ".tsv") else None
+    return infer_schema(merged, field_types)[0], vcf_headers, errors
+
+
+def write_vcf_header(file_obj, header_source, available_fields=None):
+    if isinstance(header_source, dict):
+        file_obj.write(f"##fileformat={header_source['fileformat']}\n")
+        for info_id, info in header_source['infos'].items():
+            if available_fields is None or info_id in available_fields:
+                file_obj.write(f"##INFO=<ID={info_id},Number={info.num},Type={info.type},Description=\"{info.desc}\">\n")
+        for fmt_id, fmt in header_source['formats'].items():
+            if available_fields is None or fmt_id in available_fields:
+                file_obj.write(f"##FORMAT=<ID={fmt_id},Number={fmt.num},Type={fmt.type},Description=\"{fmt.desc}\">\n")
+        file_obj.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
+        if 'FORMAT' in (available_fields or []):
+            file_obj.write("\tFORMAT")
+            for sample in header_source['samples']:
+                file_obj.write(f"\t{sample}")
+        file_obj.write("\n")
+    else:
+        file_obj.write(f"##fileformat={header_source.metadata.get('fileformat', 'VCFv4.2')}\n")
+        for info_id, info in header_source.infos.items():
+            if available_fields is None or info_id in available_fields:
+                file_obj.write(f"##INFO=<ID={info_id},Number={info.num},Type={info.type},Description=\"{info.desc}\">\n")
+        for fmt_id, fmt in header_source.formats.items():
+            if available_fields is None or fmt_id in available_fields:
+                file_obj.write(f"##FORMAT=<ID={fmt_id},Number={fmt.num},Type={fmt.type},Description=\"{fmt.desc}\">\n")
+        file_obj.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
+        if hasattr(header_source, 'samples') and len(header_source.samples) > 0 and ('FORMAT' in (available_fields or [])):
+            file_obj.write("\tFORMAT\tSAMPLE")
+        file_obj.write("\n")
+
+
+def _vcf_value(row, field):
+    val = row.get(field, '.')
+    if pd.isna(val):
+        return '.'
+    return str(val)
+
+
+def write_vcf(filepath, table, vcf_headers, columns=None):
+    """Write a table loaded from VCF files back to VCF, keeping only the given columns.
+
+    Several samples (File_Name values) become one multi-sample VCF keyed by
+    (Chrom, Pos); a single sample is written under its own header.
+    """
+    required_columns = {'Chrom', 'Pos', 'Ref', 'Alt'}
+    if not required_columns.issubset(table.columns):
+        raise ValueError("VCF export requires these essential columns: Chrom, Pos, Ref, Alt.")
+    current_columns = set(table.columns if columns is None else columns)
+
+    samples = {}
+    sample_names = []
+    format_fields = set()
+
+    for fname, df in table.groupby("File_Name", observed=True):
+        sample_name = os.path.splitext(fname)[0].split('_')[-1]
+        sample_names.append(sample_name)
+
+        visible_cols = [col for col in df.columns if col in current_columns]
+        samples[sample_name] = df[visible_cols]
+
+        for col in visible_cols:
+            if col in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
+                continue
+            if fname in vcf_headers:
+                reader = vcf_headers[fname]
+                if hasattr(reader, 'formats') and col in reader.formats:
+                    format_fields.add(col)
+                elif hasattr(reader, 'infos') and col in reader.infos:
+                    continue
+                else:
+                    if any('|' in str(val) for val in df[col].dropna().head(5)):
+                        format_fields.add(col)
+
+    if len(samples) > 1:
+        with open(filepath, 'w') as vcf_out:
+            vcf_out.write("##fileformat=VCF\n")
+
+            for fname, reader in vcf_headers.items():
+                if hasattr(reader, 'infos'):
+                    for info_id, info in reader.infos.items():
+                        if info_id in current_columns:
+                            vcf_out.write(f"##INFO=<ID={info_id},Number={info.num},Type={info.type},Description=\"{info.desc}\">\n")
+                    break
+
+            format_field_order = sorted([f for f in format_fields if f in current_columns])
+            for field in format_field_order:
+                field_spec = None
+                for fname, reader in vcf_headers.items():
+                    if hasattr(reader, 'formats') and field in reader.formats:
+                        field_spec = reader.formats[field]
+                        break
+
+                if field_spec:
+                    vcf_out.write(f"##FORMAT=<ID={field},Number={field_spec.num},Type={field_spec.type},Description=\"{field_spec.desc}\">\n")
+                else:
+                    vcf_out.write(f"##FORMAT=<ID={field},Number=1,Type=String,Description=\"Unknown field {field}\">\n")
+
+            vcf_out.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
+            if format_field_order:
+                vcf_out.write("\tFORMAT")
+                for sample in sample_names:
+                    vcf_out.write(f"\t{sample}")
+            vcf_out.write("\n")
+
+            all_positions = set()
+            for sample_data in samples.values():
+                for _, row in sample_data.iterrows():
+                    all_positions.add((row['Chrom'], row['Pos']))
+
+            for chrom, pos in sorted(all_positions):
+                variant_info = {}
+                for sample in sample_names:
+                    sample_data = samples[sample]
+                    variant = sample_data[
+                        (sample_data['Chrom'] == chrom) &
+                        (sample_data['Pos'] == pos)
+                    ]
+                    if not variant.empty:
+                        variant_info[sample] = variant.iloc[0]
+
+                if not variant_info:
+                    continue
+
+                first_var = next(iter(variant_info.values()))
+
+                vid = first_var.get('ID', '.')
+                ref = first_var.get('Ref', 'N')
+                alt = first_var.get('Alt', '.')
+                qual = first_var.get('Qual', '.')
+                filt = first_var.get('Filter', 'PASS')
+
+                info_fields = []
+                for info_field in first_var.index:
+                    if info_field in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
+                        continue
+                    if info_field not in format_fields and not pd.isna(first_var[info_field]):
+                        info_fields.append(f"{info_field}={first_var[info_field]}")
+                info = ';'.join(info_fields) if info_fields else '.'
+
+                if format_field_order:
+                    sample_data_lines = []
+                    for sample in sample_names:
+                        if sample in variant_info:
+                            var = variant_info[sample]
+                            sample_data = []
+                            for field in format_field_order:
+                                val = var.get(field, '.')
+                                if pd.isna(val):
+                                    sample_data.append('.')
+                                else:
+                                    if '|' in str(val):
+                                        sample_data.append(str(val).split('|')[0])
+                                    else:
+                                        sample_data.append(str(val))
+                            sample_data_lines.append(':'.join(sample_data))
+                        else:
+                            sample_data_lines.append(':'.join(['.'] * len(format_field_order)))
+
+                vcf_out.write(f"{chrom}\t{pos}\t{vid}\t{ref}\t{alt}\t{qual}\t{filt}\t{info}")
+                if format_field_order:
+                    vcf_out.write(f"\t{':'.join(format_field_order)}")
+                    for data in sample_data_lines:
+                        vcf_out.write(f"\t{data}")
+                vcf_out.write("\n")
+    else:
+        _write_single_sample_vcf(filepath, table, vcf_headers, columns, format_fields)
+
+
+def _write_single_sample_vcf(filepath, table, vcf_headers, columns=None, format_fields=None):
+    with open(filepath, 'w') as vcf_out:
+        for fname, df in table.groupby("File_Name", observed=True):
+            if fname not in vcf_headers:
+                continue
+
+            current_columns = set(table.columns if columns is None else columns)
+            visible_cols = [col for col in df.columns if col in current_columns]
+            df = df[visible_cols]
+
+            reader = vcf_headers[fname]
+            available_fields = set(df.columns)
+
+            if format_fields is None:
+                format_fields = set()
+                if hasattr(reader, 'formats'):
+                    format_fields.update([f for f in reader.formats.keys() if f in available_fields])
+                for col in available_fields:
+                    if col in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
+                        continue
+                    if col not in format_fields and any('|' in str(val) for val in df[col].dropna().head(5)):
+                        format_fields.add(col)
+
+            format_fields = {f for f in format_fields if f in current_columns}
+            format_field_order = sorted(format_fields)
+
+            write_vcf_header(vcf_out, reader, available_fields)
+
+            for _, row in df.iterrows():
+                chrom = _vcf_value(row, 'Chrom')
+                pos = _vcf_value(row, 'Pos')
+                vid = _vcf_value(row, 'ID')
+                ref = _vcf_value(row, 'Ref')
+                alt = _vcf_value(row, 'Alt')
+                qual = _vcf_value(row, 'Qual')
+                filt = _vcf_value(row, 'Filter')
+
+                info_fields = []
+                for info_field in row.index:
+                    if info_field in ['Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'File_Name']:
+                        continue
+                    if info_field not in format_fields and not pd.isna(row[info_field]):
+                        info_fields.append(f"{info_field}={row[info_field]}")
+                info = ';'.join(info_fields) if info_fields else '.'
+
+                if format_field_order:
+                    sample_data = []
+                    for field in format_field_order:
+                        val = row.get(field, '.')
+                        if pd.isna(val):
+                            sample_data.append('.')
+                        else:
+                            if '|' in str(val):
+                                sample_data.append(str(val).split('|')[0])
+                            else:
+                                sample_data.append(str(val))
+
+                vcf_out.write(f"{chrom}\t{pos}\t{vid}\t{ref}\t{alt}\t{qual}\t{filt}\t{info}")
+                if format_field_order:
+                    vcf_out.write(f"\t{':'.join(format_field_order)}\t{':'.join(sample_data)}")
+                vcf_out.write("\n")
+
+
+def write_table(df, path, vcf_headers=None, columns=None):
+    """Export to CSV, TSV or VCF, chosen by the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".vcf":
+        if not vcf_headers:
+            raise ValueError("VCF export can only be performed when the input data was loaded from VCF files.")
+        write_vcf(path, df, vcf_headers, columns)
+        return
+    if columns is not None:
+        df = df[list(columns)]
+    df.to_csv(path, index=False, sep='\t' if ext == ".tsv" else ',')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load, merge and filter CSV/TSV/VCF files with a GenMasterTable rule set.")
+    parser.add_argument("inputs", nargs="+", help="CSV, TSV or VCF(.gz) files of one type")
+    parser.add_argument("-r", "--rules", help="JSON or YAML rule set to apply")
+    parser.add_argument("-o", "--output", required=True, help="output .csv, .tsv or .vcf file")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="parallel file readers")
+    parser.add_argument("--threads", type=int, default=FILTER_THREADS, help="threads evaluating filter masks")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the Parquet cache")
+    parser.add_argument("-s", "--summarise", metavar="COLUMNS",
+                        help="write per-group counts for these comma-separated columns instead of the rows")
+    parser.add_argument("--scores", default="", metavar="COLUMNS",
+                        help="comma-separated score columns to aggregate (min/max/mean) in the summary")
+    args = parser.parse_args(argv)
+
+    try:
+        rule_set = load_rule_set(args.rules) if args.rules else None
+        cache = ParsedFileCache() if ParsedFileCache.available() and not args.no_cache else None
+        started = time.perf_counter()
+        table, vcf_headers, errors = load_table(args.inputs, cache=cache, workers=args.workers)
+        for name, message in errors:
+            print(f"{name}: {message}", file=sys.stderr)
+        if table.empty:
+            print("No rows were loaded.", file=sys.stderr)
+            return 1
+        print(f"Loaded {len(table):,} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        if rule_set is not None:
+            table, report = filter_table(table, rule_set, threads=args.threads)
+            print(report, file=sys.stderr)
+        if args.summarise:
+            keys = [c.strip() for c in args.summarise.split(',') if c.strip()]
+            scores = [c.strip() for c in args.scores.split(',') if c.strip()]
+            missing = [c for c in keys + scores if c not in table.columns]
+            if missing:
+                raise ValueError(f"Unknown column(s) in summary: {', '.join(missing)}")
+            if os.path.splitext(args.output)[1].lower() == ".vcf":
+                raise ValueError("Summaries can only be written to CSV or TSV.")
+            table = GroupSummary.from_view(TableView(table), keys, summary_columns(table.columns)[1], scores).table()
+        write_table(table, args.output, vcf_headers)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"{len(table):,} rows written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
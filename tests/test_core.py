@@ -0,0 +1,618 @@
+import gzip
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+import vcf
+
+import genmastertable_core
+from genmastertable_core import (ColumnInfo, ColumnRegistry, EditOverlay, FilterExpression, FilterResultCache,
+                                 GenomicIntervalIndex, GroupSummary, ParsedFileCache, SortedIndex, SummaryCache,
+                                 TableIndexes, TableView, _pyvcf_sample_frames, check_rule_set, compile_rule_set,
+                                 fast_parse_vcf, filter_table, infer_schema, iter_vcf_batches, load_rule_set, main,
+                                 read_delimited_file, read_multi_sample_vcf, read_vcf_file, region_mask, rule_mask,
+                                 save_rule_set)
+
+
+def numeric_looking_table():
+    # AF as a VCF Number=A field: mostly single numbers, one multi-allelic record kept as text
+    af = (["0.1", "0.7", "0.9", "0.2"] * 5)[:19] + ["0.7,0.2"]
+    return pd.DataFrame({"AF": af, "Gene": ["CHD7"] * 20})
+
+
+def test_infer_schema_keeps_numeric_looking_text_out_of_categoricals():
+    df, _ = infer_schema(numeric_looking_table())
+    assert not isinstance(df["AF"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["Gene"].dtype, pd.CategoricalDtype)
+    assert ColumnRegistry(df).is_numeric("AF")
+
+
+def test_threshold_rule_on_categorised_numeric_looking_column():
+    df = numeric_looking_table().astype({"AF": "category"})
+    registry = ColumnRegistry(df)
+    assert registry.is_numeric("AF")
+    for rule_set in ({"rules": [{"column": "AF", "operator": ">", "value": "0.5"}]},
+                     {"expression": "AF > 0.5"}):
+        filtered, _ = filter_table(df, check_rule_set(rule_set), registry, threads=1)
+        assert len(filtered) == 10
+        assert set(filtered["AF"].astype(str)) == {"0.7", "0.9"}
+
+
+def test_text_operators_never_match_missing_values():
+    # the same rule must give the same rows whether or not infer_schema categorised the column
+    values = ["c.1A>G", None, "c.2T>C", "p.Ala1Gly", None] * 4
+    for series in (pd.Series(values), pd.Series(values, dtype=object), pd.Series(values).astype("category")):
+        df = pd.DataFrame({"HGVSc": series})
+        registry = ColumnRegistry(df)
+        for op, val, expected in (("contains", "A>G", 4), ("starts with", "c.", 8), ("ends with", "C", 4),
+                                  ("contains", "nan", 0), ("contains", "", 12), ("starts with", "", 12),
+                                  ("does not contain", "A>G", 16), ("does not contain", "nan", 20)):
+            assert int(rule_mask(df["HGVSc"], op, val).sum()) == expected, (op, val, series.dtype)
+            for rule_set in ({"rules": [{"column": "HGVSc", "operator": op, "value": val}]},
+                             {"expression": f"HGVSc {op} '{val}'"}):
+                filtered, _ = filter_table(df, check_rule_set(rule_set), registry, threads=1)
+                assert len(filtered) == expected, (rule_set, series.dtype)
+
+
+VCF_HEADER = """##fileformat=VCFv4.2
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">
+##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP member">
+##INFO=<ID=Gene,Number=1,Type=String,Description="Gene symbol">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Sample depth">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2
+"""
+
+
+def write_vcf(tmp_path, records):
+    path = tmp_path / "calls.vcf"
+    path.write_text(VCF_HEADER + "".join("\t".join(map(str, r)) + "\n" for r in records))
+    return str(path)
+
+
+def test_fast_parser_pads_samples_that_drop_trailing_format_fields(tmp_path):
+    # every row of the GT:AD:GQ group drops GQ in both samples, and S2 drops AD on one row
+    path = write_vcf(tmp_path, [
+        ("1", 100, ".", "A", "G", 50, "PASS", "DP=10", "GT:AD:GQ", "0/1:4,6", "1/1:0,9"),
+        ("1", 200, ".", "C", "T", 60, "PASS", "DP=.", "GT:AD:GQ", "0/0:8,0", "./."),
+    ])
+    df = fast_parse_vcf(path)
+    assert df["GT"].tolist() == ["0/1|1/1", "0/0|./."]
+    assert df["AD"].tolist() == ["4,6|0,9", "8,0|."]
+    assert df["GQ"].tolist() == [".|.", ".|."]
+    slow = pd.concat(iter_vcf_batches(vcf.Reader(filename=path), "calls.vcf"), ignore_index=True)
+    for column in ("GT", "AD", "GQ", "DP"):
+        assert slow[column].tolist() == df[column].tolist(), column
+
+
+MIXED_RECORDS = [
+    ("1", 100, "rs1", "A", "G", 50, "PASS", "DP=10;AF=0.5;DB;Gene=CHD7", "GT:AD:GQ", "0/1:4,6:30", "1/1:0,9:20"),
+    ("1", 200, ".", "C", "T,G", ".", ".", "DP=.;AF=0.25,0.75", "GT:AD", "1/2:1,.,3", "./.:."),
+    ("2", 300, ".", "G", "A", 12.5, "q10", "Gene=SOX2", "GT:GQ:DP", "0/0:.:7", "0/1:15"),
+    ("X", 400, ".", "T", "C", 99, "PASS", ".", "GT", "0|1", "1|1"),
+]
+
+
+def as_text(df):
+    return df.astype(object).where(df.notna(), None).astype(str)
+
+
+def test_block_parser_matches_pyvcf(tmp_path):
+    # missing values, flags, multi-allelic records, several FORMAT layouts and an INFO/FORMAT name clash
+    path = write_vcf(tmp_path, MIXED_RECORDS)
+    slow = pd.concat(iter_vcf_batches(vcf.Reader(filename=path), "calls.vcf"), ignore_index=True)
+    fast = fast_parse_vcf(path, block_rows=3)
+    assert list(fast.columns) == list(slow.columns)
+    pd.testing.assert_frame_equal(as_text(fast), as_text(slow))
+    assert fast["DP"].tolist()[:3] == ["10", ".", "7|."]
+
+
+def test_multi_sample_ingestion_matches_pyvcf_split(tmp_path):
+    path = write_vcf(tmp_path, MIXED_RECORDS)
+    long = read_multi_sample_vcf(path)
+    assert long["File_Name"].tolist() == ["calls_S1.vcf"] * 4 + ["calls_S2.vcf"] * 4
+    slow = pd.concat(_pyvcf_sample_frames(path, "calls.vcf").values(), ignore_index=True)
+    pd.testing.assert_frame_equal(as_text(long.drop(columns="File_Name")), as_text(slow))
+    assert long["GQ"].tolist()[2] == "." and long["DP"].tolist()[6] == "."
+
+
+def bgzf_block(data):
+    deflate = zlib.compressobj(9, zlib.DEFLATED, -15)
+    cdata = deflate.compress(data) + deflate.flush()
+    header = b"\x1f\x8b\x08\x04\0\0\0\0\0\xff" + struct.pack("<H2sHH", 6, b"BC", 2, len(cdata) + 25)
+    return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def write_indexed_vcf(tmp_path, records, kind):
+    # one BGZF block per record, every chunk in the root bin: the smallest index tabix would accept
+    path = tmp_path / "calls.vcf.gz"
+    blocks = [bgzf_block(VCF_HEADER.encode())]
+    chunks = {}
+    for record in records:
+        offset = sum(map(len, blocks))
+        blocks.append(bgzf_block(("\t".join(map(str, record)) + "\n").encode()))
+        chunks.setdefault(record[0], []).append((offset << 16, (offset + len(blocks[-1])) << 16))
+    path.write_bytes(b"".join(blocks) + bgzf_block(b""))
+    names = b"".join(name.encode() + b"\0" for name in chunks)
+    refs = b""
+    for ref_chunks in chunks.values():
+        refs += struct.pack("<i", 1)
+        if kind == "tbi":
+            refs += struct.pack("<Ii", 0, len(ref_chunks))
+        else:
+            refs += struct.pack("<IQi", 0, 0, len(ref_chunks))
+        refs += b"".join(struct.pack("<QQ", beg, end) for beg, end in ref_chunks)
+        if kind == "tbi":
+            refs += struct.pack("<i", 0)
+    conf = struct.pack("<7i", 2, 1, 2, 0, ord("#"), 0, len(names)) + names
+    if kind == "tbi":
+        index = b"TBI\1" + struct.pack("<i", len(chunks)) + conf + refs
+    else:
+        index = b"CSI\1" + struct.pack("<3i", 14, 5, len(conf)) + conf + struct.pack("<i", len(chunks)) + refs
+    with gzip.open(f"{path}.{kind}", "wb") as fh:
+        fh.write(index)
+    return str(path)
+
+
+@pytest.mark.parametrize("kind", ["tbi", "csi"])
+def test_region_load_from_indexed_vcf_matches_filtering_the_whole_file(tmp_path, kind):
+    path = write_indexed_vcf(tmp_path, MIXED_RECORDS, kind)
+    whole = read_vcf_file(path)
+    for regions in ([("1", 150, 250)], [("chr1", 1, 100), ("X", 400, 400)], [("2", 1, 299)], [("7", 1, 10**9)]):
+        loaded = read_vcf_file(path, regions=regions)
+        expected = whole[region_mask(whole[["Chrom", "Pos"]], regions)].reset_index(drop=True)
+        if expected.empty:
+            assert loaded is None
+            continue
+        # a region load only sees the INFO/FORMAT keys its own records carry
+        assert expected.drop(columns=loaded.columns).isna().all().all()
+        loaded = loaded.astype({"Qual": "float64"})
+        pd.testing.assert_frame_equal(as_text(loaded), as_text(expected[loaded.columns]))
+
+
+def cohort_table(n=3000, seed=7):
+    # every column has missing values; AF is numeric-looking text with '.' for "no value"
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, fraction=0.1):
+        return pd.Series(values, dtype=object).where(rng.random(n) >= fraction, None)
+
+    cadd = rng.uniform(0, 40, n).round(1)
+    cadd[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        "Chrom": rng.choice(["1", "2", "X"], n),
+        "Pos": rng.integers(1, 10**6, n),
+        "Gene": with_missing(rng.choice(["CHD7", "SOX2", "PAX6", "OTX2"], n)),
+        "Subject_ID": with_missing([f"S{i}" for i in rng.integers(0, 50, n)]),
+        "HGVSc": with_missing([f"c.{i}A>G" if i % 3 else f"c.{i}del" for i in rng.integers(1, 500, n)]),
+        "CADD": cadd,
+        "DP": rng.integers(0, 200, n),
+        "AF": with_missing(rng.choice(["0.01", "0.1", "0.25", "0.5"], n), 0.05).fillna("."),
+    })
+
+
+def naive_matches(value, op, val):
+    """One rule on one cell, written out the long way."""
+    missing = pd.isna(value)
+    if op == "is empty":
+        return missing or value == ""
+    if op == "is not empty":
+        return not (missing or value == "")
+    if op in ("contains", "does not contain"):
+        hit = not missing and str(val).lower() in str(value).lower()
+        return hit if op == "contains" else not hit
+    if op in ("starts with", "ends with"):
+        return not missing and (str(value).startswith if op == "starts with" else str(value).endswith)(str(val))
+    if op == "in":
+        if isinstance(val[0], str):
+            return ("nan" if missing else str(value).lower()) in [v.lower() for v in val]
+        number = float("nan") if missing else float(value)
+        return number in val
+    number = float("nan") if missing else pd.to_numeric(value, errors="coerce")
+    if number != number:
+        return op == "not equals"
+    return {"equals": number == val, "not equals": number != val, ">": number > val, ">=": number >= val,
+            "<": number < val, "<=": number <= val}[op]
+
+
+def naive_rows(df, rules):
+    keep = np.ones(len(df), dtype=bool)
+    for col, op, val in rules:
+        keep &= np.array([naive_matches(v, op, val) for v in df[col].astype(object)], dtype=bool)
+    return np.flatnonzero(keep)
+
+
+def as_rule_set(rules):
+    rule_set = {"filters": [], "rules": []}
+    for col, op, val in rules:
+        if op == "in":
+            rule_set["filters"].append({"column": col, "values": [str(v) for v in val]})
+        else:
+            rule_set["rules"].append({"column": col, "operator": op, "value": str(val)})
+    return check_rule_set(rule_set)
+
+
+PLAN_CASES = [
+    [("CADD", ">", 20)],
+    [("CADD", "<=", 5.5), ("DP", ">=", 100)],
+    [("DP", "equals", 42)],
+    [("CADD", "not equals", 12.3)],
+    [("AF", ">", 0.05), ("AF", "<", 0.5)],
+    [("Gene", "in", ["chd7", "PAX6"])],
+    [("Subject_ID", "in", ["S1", "S2", "S3"]), ("CADD", ">", 10)],
+    [("DP", "in", [1.0, 2.0, 150.0])],
+    [("HGVSc", "contains", "del"), ("Gene", "is not empty", "")],
+    [("HGVSc", "starts with", "c.1"), ("HGVSc", "ends with", "G")],
+    [("HGVSc", "does not contain", "A>G"), ("Subject_ID", "is empty", "")],
+    [("Gene", "in", ["SOX2"]), ("DP", "<", 50), ("HGVSc", "contains", "a>g"), ("CADD", ">=", 30)],
+]
+
+
+def plan_rows(df, rules, registry, indexes=None, threads=1):
+    return compile_rule_set(as_rule_set(rules), df.columns, registry, indexes, threads).positions(df)
+
+
+@pytest.mark.parametrize("infer", [False, True])
+def test_filter_plan_matches_naive_masks(infer):
+    df = cohort_table()
+    if infer:
+        df = infer_schema(df)[0]
+    registry = ColumnRegistry(df)
+    for rules in PLAN_CASES:
+        expected = naive_rows(df, rules)
+        assert len(expected), rules
+        np.testing.assert_array_equal(plan_rows(df, rules, registry), expected, err_msg=str(rules))
+
+
+@pytest.mark.parametrize("infer", [False, True])
+def test_list_filters_from_value_indexes_match_naive_masks(infer):
+    df = cohort_table()
+    if infer:
+        df = infer_schema(df)[0]
+    registry, indexes = ColumnRegistry(df), TableIndexes(df)
+    for rules in PLAN_CASES:
+        if not any(op == "in" for _, op, _ in rules):
+            continue
+        np.testing.assert_array_equal(plan_rows(df, rules, registry, indexes), naive_rows(df, rules),
+                                      err_msg=str(rules))
+    assert {("Gene", False), ("Subject_ID", False), ("DP", True)} <= set(indexes.indexes)
+
+
+def test_sorted_index_bounds_skip_missing_values():
+    series = pd.Series([3.0, np.nan, 1.0, 3.0, 2.0, np.nan])
+    index = SortedIndex(series)
+    for op in (">", ">=", "<", "<=", "equals"):
+        for val in (0, 1, 2.5, 3, 4):
+            found = index.positions(*index.bounds(op, val))
+            np.testing.assert_array_equal(found, naive_rows(pd.DataFrame({"x": series}), [("x", op, val)]))
+
+
+@pytest.mark.parametrize("infer", [False, True])
+def test_threshold_rules_from_sorted_indexes_match_naive_masks(monkeypatch, infer):
+    monkeypatch.setattr(genmastertable_core, "SORTED_INDEX_MIN_ROWS", 0)
+    df = cohort_table()
+    if infer:
+        df = infer_schema(df)[0]
+    registry, indexes = ColumnRegistry(df), TableIndexes(df)
+    for rules in PLAN_CASES:
+        np.testing.assert_array_equal(plan_rows(df, rules, registry, indexes), naive_rows(df, rules),
+                                      err_msg=str(rules))
+    assert {"CADD", "DP"} <= set(indexes.sorted)
+
+
+def test_adding_rules_refines_cached_results():
+    df = cohort_table()
+    registry, indexes = ColumnRegistry(df), TableIndexes(df)
+    rules = [("Gene", "in", ["SOX2", "CHD7"]), ("DP", "<", 150), ("HGVSc", "contains", "a>g"), ("CADD", ">=", 10)]
+    for k in range(1, len(rules) + 1):
+        compiled = compile_rule_set(as_rule_set(rules[:k]), df.columns, registry, indexes)
+        np.testing.assert_array_equal(compiled.positions(df), naive_rows(df, rules[:k]))
+        assert compiled.plan.reused == k - 1
+    # no cached entry is a subset once the first rule is dropped, so nothing narrower is reused
+    compiled = compile_rule_set(as_rule_set(rules[1:]), df.columns, registry, indexes)
+    np.testing.assert_array_equal(compiled.positions(df), naive_rows(df, rules[1:]))
+    assert compiled.plan.reused == 0
+
+
+def test_filter_result_cache_evicts_least_recently_used():
+    cache = FilterResultCache(max_bytes=3 * 800)
+    for key in "abc":
+        cache.put(frozenset(key), np.arange(100))
+    cache.best_subset(frozenset("a"))
+    cache.put(frozenset("d"), np.arange(100))
+    assert set(cache.entries) == {frozenset("a"), frozenset("c"), frozenset("d")}
+    assert cache.nbytes == 3 * 800
+    assert cache.best_subset(frozenset("ab")) == (frozenset("a"), cache.entries[frozenset("a")])
+
+
+def naive_region_rows(chroms, starts, ends, regions):
+    keep = []
+    for i, (chrom, start, end) in enumerate(zip(chroms, starts, ends)):
+        if pd.isna(chrom) or pd.isna(start):
+            continue
+        end = start if pd.isna(end) else end
+        name = str(chrom)[3:] if str(chrom).lower().startswith("chr") else str(chrom)
+        if any(name == (c[3:] if c.lower().startswith("chr") else c) and start <= e and end >= s
+               for c, s, e in regions):
+            keep.append(i)
+    return np.array(keep, dtype=np.intp)
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_genomic_interval_index_matches_overlap_scan(categorical):
+    rng = np.random.default_rng(3)
+    n = 2000
+    chroms = pd.Series(rng.choice(["chr1", "1", "2", "chrX"], n), dtype=object).where(rng.random(n) > 0.05, None)
+    if categorical:
+        chroms = chroms.astype("category")
+    starts = pd.Series(rng.integers(1, 50000, n).astype(float)).where(rng.random(n) > 0.05)
+    # a few long structural variants reach back over many point variants
+    ends = (starts + np.where(rng.random(n) < 0.02, 20000, 0)).where(rng.random(n) > 0.5)
+    index = GenomicIntervalIndex(chroms, starts, ends)
+    for regions in ([("1", 100, 5000)], [("chr2", 1, 1), ("X", 30000, 30500), ("1", 49000, 60000)],
+                    [("1", 100, 200), ("chr1", 150, 300)], [("Y", 1, 10**6)]):
+        np.testing.assert_array_equal(index.positions(regions), naive_region_rows(chroms, starts, ends, regions))
+
+
+def test_region_rule_sets_filter_by_chrom_and_pos():
+    df = cohort_table()
+    rule_set = check_rule_set({"regions": ["chr1:1-200000", "X:500000-600000"], "rules": [
+        {"column": "CADD", "operator": ">", "value": "20"}]})
+    filtered, _ = filter_table(df, rule_set, indexes=TableIndexes(df), threads=1)
+    expected = naive_rows(df, [("CADD", ">", 20)])
+    expected = np.intersect1d(expected, naive_region_rows(df["Chrom"], df["Pos"], [np.nan] * len(df),
+                                                          [("1", 1, 200000), ("X", 500000, 600000)]))
+    np.testing.assert_array_equal(filtered.index.to_numpy(), expected)
+
+
+@pytest.mark.parametrize("with_indexes", [False, True])
+def test_block_parallel_masks_match_single_thread(monkeypatch, with_indexes):
+    monkeypatch.setattr(genmastertable_core, "PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setattr(genmastertable_core, "PARALLEL_MIN_BLOCK_ROWS", 64)
+    df = infer_schema(cohort_table())[0]
+    registry = ColumnRegistry(df)
+    for rules in PLAN_CASES:
+        indexes = TableIndexes(df) if with_indexes else None
+        np.testing.assert_array_equal(plan_rows(df, rules, registry, indexes, threads=4), naive_rows(df, rules),
+                                      err_msg=str(rules))
+    stitched = genmastertable_core.parallel_mask(lambda start, stop: np.arange(start, stop) % 7 == 0, 1000, threads=4)
+    np.testing.assert_array_equal(np.flatnonzero(stitched), np.arange(0, 1000, 7))
+
+
+def naive_mask(df, rule):
+    mask = np.zeros(len(df), dtype=bool)
+    mask[naive_rows(df, [rule])] = True
+    return mask
+
+
+EXPRESSION_CASES = [
+    ("CADD > 20 or DP < 10 and Gene in (SOX2)",
+     lambda m: m(("CADD", ">", 20)) | (m(("DP", "<", 10)) & m(("Gene", "in", ["SOX2"])))),
+    ("(CADD > 20 OR DP < 10) AND NOT Gene is empty",
+     lambda m: (m(("CADD", ">", 20)) | m(("DP", "<", 10))) & ~m(("Gene", "is empty", ""))),
+    ("not (HGVSc contains 'del' or Subject_ID in (S1, \"S2\"))",
+     lambda m: ~(m(("HGVSc", "contains", "del")) | m(("Subject_ID", "in", ["S1", "S2"])))),
+    ("`AF` >= 0.25 and HGVSc ends with G and not not CADD <= 30",
+     lambda m: m(("AF", ">=", 0.25)) & m(("HGVSc", "ends with", "G")) & m(("CADD", "<=", 30))),
+    ("DP in (1, 2, 150) or CADD != 12.3 and Subject_ID starts with S4",
+     lambda m: m(("DP", "in", [1.0, 2.0, 150.0]))
+     | (m(("CADD", "not equals", 12.3)) & m(("Subject_ID", "starts with", "S4")))),
+]
+
+
+@pytest.mark.parametrize("infer", [False, True])
+def test_filter_expressions_match_naive_boolean_logic(infer):
+    df = cohort_table()
+    if infer:
+        df = infer_schema(df)[0]
+    registry = ColumnRegistry(df)
+    for text, combine in EXPRESSION_CASES:
+        expected = np.flatnonzero(combine(lambda rule: naive_mask(df, rule)))
+        for indexes in (None, TableIndexes(df)):
+            found = FilterExpression.parse(text, df.columns, registry, indexes).positions(df)
+            np.testing.assert_array_equal(found, expected, err_msg=text)
+
+
+def test_expression_parser_precedence_and_errors():
+    columns = ["CADD", "DP", "Gene", "gnomAD AF"]
+    tree = FilterExpression.parse("CADD > 1 or DP < 2 and not Gene = x", columns).tree
+    assert tree[0] == "or" and tree[1][1][0] == "and" and tree[1][1][1][1][0] == "not"
+    assert FilterExpression.parse("`gnomAD AF` < 0.01 and Gene in (A, 'B C')", columns).columns == ["gnomAD AF", "Gene"]
+    for text, message in (("", "empty"), ("CADD >", "value"), ("(CADD > 1", r"Expected '\)'"),
+                          ("CADD > 1)", "Unexpected"), ("REVEL > 1", "Unknown column"),
+                          ("Gene = 'open", "Cannot read"), ("CADD 1", "operator")):
+        with pytest.raises(ValueError, match=message):
+            FilterExpression.parse(text, columns)
+    registry = ColumnRegistry(pd.DataFrame({"CADD": [1.5, 2.0], "DP": [1, 2], "Gene": ["A", "B"],
+                                            "gnomAD AF": [0.1, 0.2]}))
+    with pytest.raises(ValueError, match="numeric"):
+        FilterExpression.parse("CADD > high", columns, registry)
+
+
+def test_cell_edits_keep_registry_statistics_exact_or_rescan_once():
+    df = pd.DataFrame({"CADD": [1.0, np.nan, 5.0, 3.0], "Gene": ["A", None, "B", "A"]})
+    registry = ColumnRegistry(df)
+    reads = []
+
+    def source(col):
+        reads.append(col)
+        return df[col]
+
+    for row, new in ((1, 9.0), (2, np.nan), (0, -2.0)):
+        old = df.loc[row, "CADD"]
+        df.loc[row, "CADD"] = new
+        registry.note_edit("CADD", old, new, source)
+    info = registry.columns["CADD"]
+    assert (info.nulls, info.minimum, info.maximum) == (1, -2.0, 9.0)
+    assert registry.get("CADD") is not info and reads == ["CADD"]
+    registry.get("CADD")
+    assert reads == ["CADD"]
+    fresh = ColumnInfo(df["CADD"])
+    assert all(getattr(registry.get("CADD"), attr) == getattr(fresh, attr) for attr in ColumnInfo.__slots__)
+    registry.note_edit("Gene", None, "C")
+    assert registry.get("Gene").nulls == 0 and not registry.stale
+
+
+def test_deleted_row_bitmap_survives_refiltering_and_clearing():
+    base = cohort_table().set_index(pd.RangeIndex(100, 100 + 3000))
+    deleted = np.zeros(len(base), dtype=bool)
+    gone = set()
+    view = TableView(base, naive_rows(base, [("CADD", ">", 20)]), ["Gene", "CADD"]).drop(deleted)
+    for step in range(3):
+        shown = view.frame()
+        labels = shown.index[step::7]
+        # the app flags deleted labels by their position in the unfiltered base table
+        deleted[base.index.get_indexer(labels)] = True
+        gone.update(labels)
+        view = view.drop(deleted)
+        assert list(view.frame().index) == [label for label in shown.index if label not in gone]
+    for rows in (naive_rows(base, [("DP", "<", 100)]), None):
+        view = TableView(base, rows, ["Gene", "CADD"]).drop(deleted)
+        expected = base.index if rows is None else base.index[rows]
+        frame = view.frame()
+        assert list(frame.index) == [label for label in expected if label not in gone]
+        assert list(frame.columns) == ["Gene", "CADD"]
+    assert view.narrow(np.flatnonzero(deleted)).rows.size == 0
+
+
+def test_edit_overlay_matches_editing_a_copy():
+    base = infer_schema(cohort_table())[0]
+    before = base.copy()
+    edits = EditOverlay()
+    edited = base.astype(object)
+    # numbers, text typed into numeric and categorical cells, and cleared cells
+    for position, column, value in ((0, "CADD", 33.3), (5, "CADD", None), (7, "DP", "n/a"), (9, "Gene", "NEW1"),
+                                    (11, "Gene", None), (2999, "HGVSc", "c.1del"), (7, "DP", 12)):
+        edits.set(position, column, value)
+        edited.iloc[position, edited.columns.get_loc(column)] = value
+    assert len(edits) == 6
+    for rows, columns in ((None, None), (np.arange(0, 3000, 3), ["CADD", "Gene", "DP"]), (np.array([1, 2, 3]), None)):
+        view = TableView(base, rows, columns)
+        frame = edits.apply(view, view.frame())
+        expected = edited.iloc[view.positions()][view.columns]
+        pd.testing.assert_frame_equal(as_text(frame), as_text(expected))
+    pd.testing.assert_frame_equal(base, before)
+
+
+def naive_summary(frame, keys, carrier, scores):
+    grouped = frame.groupby(keys, sort=True, dropna=False, observed=True)
+    out = grouped.size().to_frame("Variants")
+    out["Carriers"] = grouped[carrier].nunique()
+    for score in scores:
+        stats = pd.to_numeric(frame[score], errors="coerce").astype(float).groupby(
+            [frame[k] for k in keys], sort=True, dropna=False, observed=True).agg(["min", "max", "mean"])
+        for stat in stats.columns:
+            out[f"{score}_{stat}"] = stats[stat]
+    return out.sort_values("Variants", ascending=False, kind="stable").reset_index()
+
+
+def assert_same_summary(summary, expected):
+    pd.testing.assert_frame_equal(as_text(summary.table()), as_text(expected))
+
+
+@pytest.mark.parametrize("infer", [False, True])
+def test_group_summary_matches_groupby_through_deletes(infer):
+    base = cohort_table()
+    if infer:
+        base = infer_schema(base)[0]
+    keys, carrier, scores = ["Gene", "Chrom"], "Subject_ID", ["CADD", "AF"]
+    rows = naive_rows(base, [("DP", ">=", 50)])
+    edits = EditOverlay()
+    edits.set(int(rows[0]), "CADD", 99.0)
+    summary = GroupSummary.from_view(TableView(base, rows), keys, carrier, scores, edits)
+    edited = base.astype({"CADD": float}).copy()
+    edited.loc[edited.index[rows[0]], "CADD"] = 99.0
+    assert_same_summary(summary, naive_summary(edited.iloc[rows], keys, carrier, scores))
+    alive = set(rows)
+    outside = np.setdiff1d(np.arange(len(base)), rows)[:5]
+    assert not summary.delete(outside)
+    sox2 = [r for r in rows if base["Gene"].iloc[r] == "SOX2"]
+    for deleted in (rows[::9], sox2, rows[base["Gene"].iloc[rows].isna().to_numpy()]):
+        assert summary.delete(deleted)
+        alive -= set(deleted)
+        kept = np.array(sorted(alive))
+        assert len(summary) == len(kept)
+        assert_same_summary(summary, naive_summary(edited.iloc[kept], keys, carrier, scores))
+    assert "SOX2" not in set(summary.table()["Gene"].dropna())
+
+
+def test_summary_cache_drops_old_filter_versions_and_folds_deletes():
+    base = cohort_table()
+    cache = SummaryCache(max_entries=2)
+    view = TableView(base)
+    by_gene = GroupSummary.from_view(view, ["Gene"], "Subject_ID")
+    by_chrom = GroupSummary.from_view(view, ["Chrom"], "Subject_ID", ["DP"])
+    cache.put(SummaryCache.key(["Gene"], "Subject_ID", (), 1), by_gene)
+    cache.put(SummaryCache.key(["Chrom"], "Subject_ID", ["DP"], 1), by_chrom)
+    assert cache.get(SummaryCache.key(["Gene"], "Subject_ID", [], 1)) is by_gene and cache.hits == 1
+    cache.delete_rows(np.arange(10))
+    assert len(by_gene) == len(by_chrom) == len(base) - 10
+    assert_same_summary(by_chrom, naive_summary(base.iloc[10:], ["Chrom"], "Subject_ID", ["DP"]))
+    cache.put(SummaryCache.key(["Gene"], None, (), 2), GroupSummary.from_view(view, ["Gene"]))
+    assert list(cache.entries) == [(("Gene",), None, (), 2)]
+    assert cache.get(SummaryCache.key(["Gene"], "Subject_ID", (), 1)) is None
+
+
+@pytest.mark.skipif(not ParsedFileCache.available(), reason="needs pyarrow")
+def test_parsed_file_cache_roundtrip(tmp_path, monkeypatch):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    path = write_vcf(tmp_path, MIXED_RECORDS)
+    parsed = read_vcf_file(path, cache=cache)
+    parses = []
+
+    def counting_parse(*args, **kwargs):
+        parses.append(args[0])
+        return fast_parse_vcf(*args, **kwargs)
+
+    monkeypatch.setattr(genmastertable_core, "fast_parse_vcf", counting_parse)
+    cached = read_vcf_file(path, cache=cache)
+    pd.testing.assert_frame_equal(as_text(cached), as_text(parsed))
+    assert cached.attrs["vcf_header"] == parsed.attrs["vcf_header"]
+    # a projection is served from the full entry
+    projected = read_vcf_file(path, cache=cache, columns=["Pos", "GT", "DP"])
+    assert list(projected.columns) == ["Pos", "DP", "GT", "File_Name"]
+    assert not parses
+    # rewriting the file changes its key
+    write_vcf(tmp_path, MIXED_RECORDS[:2])
+    assert len(read_vcf_file(path, cache=cache)) == 2 and parses == [path]
+
+    table = tmp_path / "cohort.tsv"
+    cohort_table().to_csv(table, sep="\t", index=False)
+    first = read_delimited_file(str(table), "\t", cache)
+    pd.testing.assert_frame_equal(read_delimited_file(str(table), "\t", cache), first)
+    assert first["Gene"].isna().any() and first["CADD"].isna().any()
+
+    cache.max_bytes = 0
+    cache.put(str(table), "tsv", first)
+    assert not list((tmp_path / "cache").glob("*.parquet"))
+
+
+def test_headless_rule_set_file_and_command_line(tmp_path):
+    rules = [("Gene", "in", ["SOX2", "CHD7"]), ("CADD", ">", 20)]
+    rule_set = as_rule_set(rules)
+    rule_set["expression"] = "HGVSc contains del or DP < 10"
+    save_rule_set(str(tmp_path / "rules.json"), rule_set)
+    assert load_rule_set(str(tmp_path / "rules.json")) == rule_set
+    with pytest.raises(ValueError, match="Unknown rule set key"):
+        check_rule_set({"rule": []})
+
+    table = tmp_path / "cohort.tsv"
+    df = cohort_table()
+    df.to_csv(table, sep="\t", index=False)
+    out = tmp_path / "out.csv"
+    argv = [str(table), "-r", str(tmp_path / "rules.json"), "-o", str(out), "--workers", "1", "--threads", "1",
+            "--no-cache"]
+    assert main(argv) == 0
+    expected = np.intersect1d(naive_rows(df, rules), np.flatnonzero(
+        naive_mask(df, ("HGVSc", "contains", "del")) | naive_mask(df, ("DP", "<", 10))))
+    written = pd.read_csv(out)
+    assert written["Pos"].tolist() == df["Pos"].iloc[expected].tolist()
+    assert main(argv + ["--summarise", "Gene", "--scores", "CADD"]) == 0
+    summary = pd.read_csv(out)
+    assert summary["Variants"].sum() == len(expected) and set(summary["Gene"]) == {"SOX2", "CHD7"}
+    assert main([str(table), "-o", str(out), "--summarise", "REVEL", "--no-cache"]) == 1